@@ -1,17 +1,56 @@
 import os
+import re
+import csv
+import html
+import unicodedata
 import sys
 import json
+import gzip
+import io
+import zlib
+import struct
 import random
+import math
 import shutil
 import time
+import mmap
+import hashlib
+import sqlite3
+import zipfile
+import tempfile
+import uuid
+import itertools
 import threading
+import heapq
+import traceback
+import linecache
+import tracemalloc
+import weakref
+import gc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, lru_cache
+from operator import itemgetter
+from collections import Counter, deque
+from bisect import bisect_left
+from types import MappingProxyType
+from array import array
+try:
+    import zstandard        # необязателен: без него .json.zst не показываются
+except ImportError:
+    zstandard = None
+try:
+    from PIL import Image   # необязателен: без него иконки режутся своим кодом
+except ImportError:
+    Image = None
 import flet
 from flet import (
     Page, TextField, ElevatedButton, Column, Row, Text, Icon,
     Tabs, Tab, Dropdown, dropdown, Switch, FilePicker,
     FilePickerResultEvent, Container, Colors, ThemeMode,
     Checkbox, alignment, border_radius, border, padding,
-    SnackBar, IconButton, Icons, CupertinoAlertDialog, CupertinoDialogAction
+    SnackBar, IconButton, Icons, CupertinoAlertDialog, CupertinoDialogAction,
+    TextSpan, TextStyle, TextDecoration, ListTile
 )
 
 # ─── 1) Определяем две разные директории ────────────────────────────
@@ -27,9 +66,21 @@ else:
 # ─── 2) Пути к ресурсам и к данным ───────────────────────────────────
 LANG_FILE     = os.path.join(RESOURCE_DIR,   "langs.json")
 ICON_FILE     = os.path.join(RESOURCE_DIR,   "assets", "icon.png")
+# уменьшенные копии иконки (собираются из ICON_FILE, см. build_icon_assets)
+ICON_DIR      = os.path.join(RESOURCE_DIR,   "assets", "icons")
 
 SETTINGS_FILE = os.path.join(DATA_DIR,       "settings.json")
 WORDS_DIR     = os.path.join(DATA_DIR,       "words")
+# индексы и кеши — можно удалить, пересоберутся сами
+CACHE_DIR     = os.path.join(DATA_DIR,       "cache")
+# настройки и счётчики по пользователям (settings.json — значения по умолчанию)
+PROFILES_DB   = os.path.join(DATA_DIR,       "profiles.sqlite")
+# вердикты проверки словарей по хешу содержимого
+VALIDATION_DB = os.path.join(CACHE_DIR,      "validation.sqlite")
+# незаконченный тест (для «продолжить»), по файлу на пользователя
+SESSIONS_DIR  = os.path.join(DATA_DIR,       "sessions")
+# журнал пройденных тестов, по файлу *.jsonl на пользователя
+HISTORY_DIR   = os.path.join(DATA_DIR,       "history")
 # ======================================
 
 DEFAULT_SET = {
@@ -47,15 +98,2015 @@ def load_translations():
     except:
         return {}
 
+
+# ─── Diff ответов (sentence_mode) ─────────────────────────────────────
+# Токены: отдельный иероглиф/кана, слово или знак препинания + хвостовой пробел
+_TOKEN_RE = re.compile(
+    r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]|\w+|[^\w\s])(\s*)"
+)
+# латинское/кириллическое слово на стыке чанков (CJK пишется без пробелов)
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_WORD_START_RE = re.compile(rf"(?![{_CJK}])\w")
+_WORD_END_RE   = re.compile(rf"(?![{_CJK}])\w$")
+# сколько карточек вокруг видимой области дифим за один раз
+DIFF_BATCH = 20
+
+def tokenize_answer(text):
+    # [(ключ для сравнения, текст для показа)]
+    return [(m.group(1).lower(), m.group(0)) for m in _TOKEN_RE.finditer(text)]
+
+def _diff_keys(a, b):
+    # Myers O((N+M)·D) с линейной памятью: режем общий префикс/суффикс,
+    # ищем «середину» пути встречными проходами и рекурсивно делим задачу
+    if a == b:
+        return [("=", k) for k in a]
+    p = 0
+    while p < len(a) and p < len(b) and a[p] == b[p]:
+        p += 1
+    s = 0
+    while s < len(a) - p and s < len(b) - p and a[-1 - s] == b[-1 - s]:
+        s += 1
+    head = [("=", k) for k in a[:p]]
+    tail = [("=", k) for k in a[len(a) - s:]]
+    a, b = a[p:len(a) - s], b[p:len(b) - s]
+    if not a:
+        return head + [("+", k) for k in b] + tail
+    if not b:
+        return head + [("-", k) for k in a] + tail
+    return head + _diff_bisect(a, b) + tail
+
+def _diff_bisect(a, b):
+    n, m = len(a), len(b)
+    max_d = (n + m + 1) // 2
+    off = max_d
+    v_len = 2 * max_d + 2
+    v1 = [-1] * v_len
+    v2 = [-1] * v_len
+    v1[off + 1] = 0
+    v2[off + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d):
+        # прямой проход
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_off = off + k1
+            if k1 == -d or (k1 != d and v1[k1_off - 1] < v1[k1_off + 1]):
+                x1 = v1[k1_off + 1]
+            else:
+                x1 = v1[k1_off - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[x1] == b[y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_off] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_off = off + delta - k1
+                if 0 <= k2_off < v_len and v2[k2_off] != -1:
+                    if x1 >= n - v2[k2_off]:
+                        return (_diff_keys(a[:x1], b[:y1]) +
+                                _diff_keys(a[x1:], b[y1:]))
+        # обратный проход
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_off = off + k2
+            if k2 == -d or (k2 != d and v2[k2_off - 1] < v2[k2_off + 1]):
+                x2 = v2[k2_off + 1]
+            else:
+                x2 = v2[k2_off - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[n - x2 - 1] == b[m - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_off] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_off = off + delta - k2
+                if 0 <= k1_off < v_len and v1[k1_off] != -1:
+                    x1 = v1[k1_off]
+                    y1 = off + x1 - k1_off
+                    if x1 >= n - x2:
+                        return (_diff_keys(a[:x1], b[:y1]) +
+                                _diff_keys(a[x1:], b[y1:]))
+    return [("-", k) for k in a] + [("+", k) for k in b]
+
+def diff_answer(expected, entered):
+    # [(op, текст)]: "=" совпало, "-" пропущено учеником, "+" лишнее у ученика
+    ta, tb = tokenize_answer(expected), tokenize_answer(entered)
+    ops = _diff_keys([k for k, _ in ta], [k for k, _ in tb])
+    out, i, j = [], 0, 0
+    for op, _ in ops:
+        if op == "+":
+            txt = tb[j][1]; j += 1
+        else:
+            # «=» показываем так, как ввёл ученик
+            txt = tb[j][1] if op == "=" else ta[i][1]
+            i += 1
+            if op == "=":
+                j += 1
+        # у последнего слова ученика нет пробела — не склеиваем со следующим
+        if out and _WORD_END_RE.search(out[-1][1]) and _WORD_START_RE.match(txt):
+            out[-1] = (out[-1][0], out[-1][1] + " ")
+        out.append((op, txt))
+    return out
+
+def closest_variant(variants, entered):
+    # вариант с наибольшим числом общих токенов — O(n), без полного дифа
+    ent = Counter(k for k, _ in tokenize_answer(entered))
+    best, best_score = variants[0] if variants else "", -1
+    for v in variants:
+        score = sum((Counter(k for k, _ in tokenize_answer(v)) & ent).values())
+        if score > best_score:
+            best, best_score = v, score
+    return best
+
+def diff_markup(ops):
+    # текстовая разметка для копирования: [-лишнее-] {+пропущено+}
+    parts = []
+    for op, txt in ops:
+        word, ws = txt.rstrip(), txt[len(txt.rstrip()):]
+        if op == "+":
+            parts.append(f"[-{word}-]{ws}")
+        elif op == "-":
+            parts.append(f"{{+{word}+}}{ws}")
+        else:
+            parts.append(txt)
+    return "".join(parts).strip()
+
+
+# ─── Проверка ответов ────────────────────────────────────────────────
+# общее ядро для GUI (on_answer) и пакетной проверки из командной строки
+
+# шаги нормализации ответа (settings.json "normalize", CLI --normalize), по порядку:
+#   nfkc   — NFKC: полноширинные/полуширинные знаки, NFD‑ввод, лигатуры
+#   case   — casefold
+#   kana   — катакана → хирагана, любые тире после каны → «ー»
+#   macron — только ромадзи (перевод→слово в ромадзи‑режиме): ā ī ū ē ō
+#            (и с ^) → aa ii uu ee oo, как kana_to_romaji пишет «ー»;
+#            ou и удвоенные гласные не трогаем — obasan ≠ obaasan
+#   punct  — точки, дефисы и апострофы внутри слова убираем (U.S.A. = usa,
+#            kin'en = kinen), кроме десятичной точки (1.5 ≠ 15);
+#            остальная пунктуация → пробел
+#   space  — пробелы схлопываем
+NORMALIZE_STEPS = ("nfkc", "case", "kana", "macron", "punct", "space")
+
+_LONG_DASH_RE = re.compile(r"(?<=[\u3041-\u3096\u30fc])[-\u2010-\u2015\u2212~\u301c\uff5e]")
+_MACRON_RE    = re.compile(r"([aiueo])[\u0304\u0302]", re.IGNORECASE)
+_APOSTROPHES  = "'\u2019\u02bc`"
+_INWORD_RE    = re.compile(r"(?<=\w)(?:[\-\u2010\u2011]|(?<!\d)\.|\.(?!\d))(?=\w)")
+_DECIMAL_RE   = re.compile(r"(?<=\d)\.(?=\d)")
+
+def normalize_steps(steps):
+    # из настроек/CLI: неизвестные шаги отбрасываем, порядок — канонический
+    return tuple(s for s in NORMALIZE_STEPS if s in steps)
+
+@lru_cache(maxsize=64)
+def _plain_steps(steps):
+    # для всего, что не ромадзи
+    return tuple(s for s in steps if s != "macron")
+
+@lru_cache(maxsize=65536)
+def normalize_answer(text, steps=NORMALIZE_STEPS):
+    # варианты словаря нормализуются один раз, ввод — на каждый ответ;
+    # строки повторяются, поэтому кеш
+    out = text
+    if "nfkc" in steps:
+        out = unicodedata.normalize("NFKC", out)
+    out = out.casefold() if "case" in steps else out.lower()
+    if "kana" in steps:
+        out = _LONG_DASH_RE.sub("ー", _to_hiragana(out))
+    if "macron" in steps:
+        out = _MACRON_RE.sub(r"\1\1", unicodedata.normalize("NFD", out))
+        out = unicodedata.normalize("NFC", out)
+    if "punct" in steps:
+        # десятичную точку прячем от замены пунктуации на пробел
+        out = _DECIMAL_RE.sub("\0", _INWORD_RE.sub("", out))
+        out = "".join("" if ch in _APOSTROPHES else
+                      " " if unicodedata.category(ch).startswith("P") else ch
+                      for ch in out).replace("\0", ".")
+    out = " ".join(out.split()) if "space" in steps else out.strip()
+    # ответ из одной пунктуации сравниваем как есть
+    return out or text.strip().lower()
+
+def answer_variants(card, direction_reversed=False, romaji_mode=False, steps=NORMALIZE_STEPS):
+    key = "word" if direction_reversed else "translation"
+    plain = _plain_steps(steps)
+    variants = [normalize_answer(v, plain) for v in card[key].split(",") if v.strip()]
+    # если режим перевод→слово и включён ромадзи‑мод, добавляем варианты ромадзи
+    # (только к ним — и к вводу для сравнения с ними — применяется macron)
+    if direction_reversed and romaji_mode:
+        variants.extend(normalize_answer(r, steps)
+                        for r in card.get("romaji", "").split(",") if r.strip())
+    return variants
+
+def grade_answer(card, entered, direction_reversed=False, romaji_mode=False, variants=None,
+                 steps=NORMALIZE_STEPS):
+    # variants — заранее посчитанный answer_variants (с теми же steps) для этой карточки
+    if variants is None:
+        variants = answer_variants(card, direction_reversed, romaji_mode, steps)
+    if normalize_answer(entered, _plain_steps(steps)) in variants:
+        return True
+    return (direction_reversed and romaji_mode and "macron" in steps
+            and normalize_answer(entered, steps) in variants)
+
+# контрольные случаи нормализации: python mineWin.py selfcheck
+# (карточка, ввод, перевод→слово, ромадзи‑режим, ожидаемый результат)
+GRADE_CHECKS = (
+    ({"word": "コーヒー", "translation": "coffee"}, "ｃｏｆｆｅｅ", False, False, True),
+    ({"word": "コーヒー", "translation": "coffee"}, "ｺｰﾋｰ", True, False, True),
+    ({"word": "x", "translation": "USA"}, "U.S.A.", False, False, True),
+    ({"word": "x", "translation": "1.5 kg"}, "1.5 kg", False, False, True),
+    ({"word": "x", "translation": "1.5 kg"}, "15 kg", False, False, False),
+    ({"word": "x", "translation": "four"}, "for", False, False, False),
+    ({"word": "x", "translation": "good"}, "god", False, False, False),
+    ({"word": "x", "translation": "kōhī"}, "koohii", False, False, False),
+    ({"word": "コーヒー", "translation": "x", "romaji": "kōhī"}, "koohii", True, True, True),
+    ({"word": "コーヒー", "translation": "x", "romaji": "koohii"}, "kōhī", True, True, True),
+    ({"word": "おばあさん", "translation": "x", "romaji": "obaasan"}, "obasan", True, True, False),
+    ({"word": "ゆうき", "translation": "x", "romaji": "yuuki"}, "yuki", True, True, False),
+    ({"word": "きんえん", "translation": "x", "romaji": "kin'en"}, "kinen", True, True, True),
+)
+
+def check_grading():
+    # -> список несовпавших случаев GRADE_CHECKS
+    return [(card, entered, expected) for card, entered, rev, rom, expected in GRADE_CHECKS
+            if grade_answer(card, entered, rev, rom) != expected]
+
+
+# ─── Сжатые словари (.json.gz / .json.zst) ───────────────────────────
+DECK_FORMATS = {"json": ".json", "gz": ".json.gz", "zst": ".json.zst"}
+DECK_EXTS    = (".json", ".json.gz") + ((".json.zst",) if zstandard else ())
+# уровень сжатия по умолчанию; свой уровень словарь хранит в "compress_level"
+DEFAULT_COMPRESS_LEVEL = {"gz": 6, "zst": 3}
+# варианты для выпадашки редактора: формат:уровень
+COMPRESS_CHOICES = ["json", "gz:1", "gz:6", "gz:9"] + \
+                   (["zst:3", "zst:10", "zst:19"] if zstandard else [])
+
+def is_deck_file(fn):
+    return fn.lower().endswith(DECK_EXTS)
+
+def deck_format(fn):
+    fn = fn.lower()
+    if fn.endswith(".json.gz"):
+        return "gz"
+    if fn.endswith(".json.zst"):
+        return "zst"
+    return "json"
+
+def deck_stem(fn):
+    fn = os.path.basename(fn)
+    return fn[:-len(DECK_FORMATS[deck_format(fn)])] if is_deck_file(fn) else os.path.splitext(fn)[0]
+
+def open_deck(path):
+    # текстовый поток с распаковкой на лету
+    fmt = deck_format(path)
+    if fmt == "gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if fmt == "zst":
+        if zstandard is None:
+            raise ValueError("zstandard is not installed")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+                                encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def load_deck(path):
+    with open_deck(path) as f:
+        return json.load(f)
+
+def deck_writer(path, fmt="json", level=None):
+    # текстовый поток со сжатием; fmt задаём явно — пишем во временный файл
+    level = level or DEFAULT_COMPRESS_LEVEL.get(fmt)
+    if fmt == "gz":
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=level)
+    if fmt == "zst":
+        if zstandard is None:
+            raise ValueError("zstandard is not installed")
+        raw = open(path, "wb")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=True),
+                                encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+def save_deck(path, payload, level=None):
+    # формат по расширению path; запись через временный файл
+    tmp = path + ".tmp"
+    try:
+        with deck_writer(tmp, deck_format(path), level) as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# ─── Кеш проверки словарей по хешу содержимого ───────────────────────
+# поднять, если поменялись правила _validate_data — старые вердикты забудутся
+VALIDATION_SCHEMA = 1
+
+class DeckError(ValueError):
+    # словарь не прошёл проверку; key/err_args — для self.t(key).format(**err_args)
+    def __init__(self, key, err_args=None):
+        super().__init__(key)
+        self.key      = key
+        self.err_args = err_args or {}
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _validate_data(data):
+    # проверяем, что есть ключ "cards" и это список
+    cards = data.get("cards")
+    if not isinstance(cards, list):
+        return "import_error_no_cards", {}
+    # каждый элемент должен быть dict с word и translation
+    for i, c in enumerate(cards):
+        if not isinstance(c, dict) or \
+        "word" not in c or not isinstance(c["word"], str) or \
+        "translation" not in c or not isinstance(c["translation"], str):
+            return "import_error_bad_card", {"idx": i+1}
+    return None, {}
+
+class ValidationCache:
+    # хеш содержимого -> (вердикт, число карточек, заголовок); (путь, размер,
+    # mtime) -> хеш, чтобы неизменённый файл даже не перечитывать.
+    # Соединения по потокам, как в ProfileStore; пишут и процессы пула импорта
+    def __init__(self, path=VALIDATION_DB):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sqlite3.connect(path).close()
+        except (OSError, sqlite3.Error):
+            path = ":memory:"
+        self.path   = path
+        self._local = threading.local()
+        self._db().execute("PRAGMA journal_mode=WAL")
+
+    def _db(self):
+        # схему создаём на каждом новом соединении: в запасном ":memory:"
+        # у каждого потока своя пустая база
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db:
+                db.executescript("""
+                    CREATE TABLE IF NOT EXISTS verdicts(digest TEXT PRIMARY KEY, schema INTEGER,
+                                                        err_key TEXT, err_args TEXT,
+                                                        cards INTEGER, title TEXT) WITHOUT ROWID;
+                    CREATE TABLE IF NOT EXISTS files(path TEXT PRIMARY KEY, size INTEGER,
+                                                     mtime_ns INTEGER, digest TEXT) WITHOUT ROWID;
+                """)
+        return db
+
+    def digest(self, path):
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        db = self._db()
+        row = db.execute("SELECT digest FROM files WHERE path=? AND size=? AND mtime_ns=?",
+                         (key, st.st_size, st.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        digest = file_digest(path)
+        with db:
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                       (key, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def check(self, path):
+        # -> (вердикт, словарь); словарь None, если вердикт взят из кеша
+        #    или файл битый. OSError (файла нет) пробрасываем — это не вердикт
+        digest = self.digest(path)
+        db = self._db()
+        row = db.execute("SELECT err_key, err_args, cards, title FROM verdicts "
+                         "WHERE digest=? AND schema=?", (digest, VALIDATION_SCHEMA)).fetchone()
+        if row:
+            return {"err_key": row[0], "err_args": json.loads(row[1]),
+                    "cards": row[2], "title": row[3]}, None
+        data = None
+        try:
+            data = load_deck(path)
+            err_key, err_args = _validate_data(data)
+        except Exception as ex:
+            err_key, err_args = "import_error_json", {"error": str(ex)}
+        ok = err_key is None
+        verdict = {"err_key": err_key, "err_args": err_args,
+                   "cards": len(data["cards"]) if ok else 0,
+                   "title": str(data.get("title", "")) if ok else ""}
+        with db:
+            db.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                       (digest, VALIDATION_SCHEMA, err_key, json.dumps(err_args, ensure_ascii=False),
+                        verdict["cards"], verdict["title"]))
+        return verdict, data if ok else None
+
+_validation = None
+_validation_lock = threading.Lock()
+
+def validation_cache():
+    # один на процесс (в том числе в каждом воркере пула импорта)
+    global _validation
+    with _validation_lock:
+        if _validation is None:
+            _validation = ValidationCache()
+        return _validation
+
+
+# ─── Импорт словарей ─────────────────────────────────────────────────
+# с какого числа файлов валидация идёт в пуле процессов
+IMPORT_POOL_MIN = 8
+
+def validate_deck_file(path):
+    # (None, {}) если файл годится, иначе (ключ ошибки i18n, аргументы);
+    # верхнеуровневая функция, чтобы её можно было отдать в ProcessPoolExecutor.
+    # Уже виденный (по хешу) файл заново не разбирается
+    try:
+        verdict, _ = validation_cache().check(path)
+    except Exception as ex:
+        return "import_error_json", {"error": str(ex)}
+    return verdict["err_key"], verdict["err_args"]
+
+# какие колонки CSV/TSV (номер или имя из заголовка) и поля заметки Anki
+# (номер или имя поля) идут в word / translation / romaji
+DEFAULT_IMPORT_FIELDS = {"word": 0, "translation": 1, "romaji": 2}
+IMPORT_EXTS = DECK_EXTS + (".csv", ".tsv", ".apkg")
+
+def _clean_anki_field(v):
+    v = re.sub(r"\[sound:[^\]]*\]", "", v)
+    v = re.sub(r"<br\s*/?>", " ", v, flags=re.I)
+    return html.unescape(re.sub(r"<[^>]+>", "", v)).strip()
+
+def _map_row(row, cols):
+    # cols: {поле: индекс}; пустые word/translation — строка пропускается
+    card = {}
+    for key, i in cols.items():
+        v = row[i].strip() if i is not None and i < len(row) else ""
+        if v:
+            card[key] = v
+    if "word" in card and "translation" in card:
+        return card
+    return None
+
+def _resolve_columns(fields, header):
+    # имя колонки -> номер по заголовку; номера остаются как есть
+    cols = {}
+    for key, col in fields.items():
+        if isinstance(col, str):
+            cols[key] = header.index(col) if header and col in header else None
+        else:
+            cols[key] = col
+    return cols
+
+def _is_header_row(row, cols):
+    named = [(key, row[i].strip().lower()) for key, i in cols.items()
+             if i is not None and i < len(row) and row[i].strip()]
+    return bool(named) and all(key == v for key, v in named)
+
+def iter_csv_cards(path, fields=DEFAULT_IMPORT_FIELDS):
+    # построчно, без загрузки файла целиком
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".tsv"):
+            delim = "\t"
+        else:
+            try:
+                delim = csv.Sniffer().sniff(f.read(4096), delimiters=",;\t").delimiter
+            except csv.Error:
+                delim = ","
+            f.seek(0)
+        reader = csv.reader(f, delimiter=delim)
+        header = None
+        if any(isinstance(c, str) for c in fields.values()):
+            header = [h.strip() for h in next(reader, [])]
+        cols = _resolve_columns(fields, header)
+        if header is None:
+            # поля по номерам: первая строка — заголовок, если в её колонках
+            # стоят имена полей (так пишет export_deck_csv)
+            first = next(reader, None)
+            if first is not None and not _is_header_row(first, cols):
+                reader = itertools.chain([first], reader)
+        for row in reader:
+            card = _map_row(row, cols)
+            if card:
+                yield card
+
+def iter_apkg_cards(path, fields=DEFAULT_IMPORT_FIELDS):
+    # .apkg — zip с SQLite внутри; базу распаковываем потоком во временный файл.
+    # Новый Anki кладёт настоящие данные в collection.anki21b (zstd), а
+    # collection.anki2 рядом — заглушка «обновите Anki»: её не импортируем
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        member = next((n for n in ("collection.anki21b", "collection.anki21", "collection.anki2")
+                       if n in names), None)
+        if member is None:
+            raise ValueError("no collection.anki2 in package")
+        if member == "collection.anki21b" and zstandard is None:
+            raise ValueError("collection.anki21b needs zstandard installed")
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "collection.db")
+            with zf.open(member) as src, open(db_path, "wb") as dst:
+                if member == "collection.anki21b":
+                    src = zstandard.ZstdDecompressor().stream_reader(src)
+                shutil.copyfileobj(src, dst)
+            conn = sqlite3.connect(db_path)
+            try:
+                # имена полей по типам заметок (для маппинга по имени)
+                headers = {}
+                try:
+                    models = json.loads(conn.execute("SELECT models FROM col").fetchone()[0])
+                    for mid, m in models.items():
+                        headers[int(mid)] = [fl["name"] for fl in m.get("flds", [])]
+                except Exception:
+                    pass
+                if not headers:
+                    # схема anki21b: типы заметок и их поля — отдельные таблицы
+                    try:
+                        for ntid, name in conn.execute(
+                                "SELECT ntid, name FROM fields ORDER BY ntid, ord"):
+                            headers.setdefault(ntid, []).append(name)
+                    except sqlite3.Error:
+                        pass
+                col_cache = {}
+                for mid, flds in conn.execute("SELECT mid, flds FROM notes ORDER BY id"):
+                    if mid not in col_cache:
+                        col_cache[mid] = _resolve_columns(fields, headers.get(mid))
+                    card = _map_row([_clean_anki_field(v) for v in flds.split("\x1f")],
+                                    col_cache[mid])
+                    if card:
+                        yield card
+            finally:
+                conn.close()
+
+def write_deck_stream(path, title, cards, sentence_mode=False):
+    # пишем JSON по карточке за раз во временный файл, потом атомарно подменяем
+    tmp = path + ".tmp"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("{\n  \"title\": " + json.dumps(title, ensure_ascii=False) + ",\n  \"cards\": [")
+        for card in cards:
+            f.write(("," if count else "") + "\n    " + json.dumps(card, ensure_ascii=False))
+            count += 1
+        f.write("\n  ],\n  \"sentence_mode\": " + json.dumps(bool(sentence_mode)) + "\n}\n")
+    os.replace(tmp, path)
+    return count
+
+def export_deck_csv(src, dst):
+    # обратный экспорт: словарь -> CSV/TSV с заголовком word,translation,romaji;
+    # карточки читаем через mmap по одной — словарь целиком в память не грузим
+    deck = MappedDeck(src)
+    delim = "\t" if dst.lower().endswith(".tsv") else ","
+    try:
+        with open(dst, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f, delimiter=delim)
+            w.writerow(["word", "translation", "romaji"])
+            for i in range(len(deck)):
+                c = deck[i]
+                w.writerow([c.get("word", ""), c.get("translation", ""), c.get("romaji", "")])
+    finally:
+        deck.close()
+
+def import_target_name(src):
+    # словарь (в том числе сжатый) сохраняет имя, остальное становится .json
+    return os.path.basename(src) if is_deck_file(src) else deck_stem(src) + ".json"
+
+def import_target_names(sources, root=None):
+    # при импорте папки unit1/words.csv и unit2/words.csv не должны затирать
+    # друг друга: совпавшим именам добавляем путь от корня, а если и так
+    # совпало — номер (регистр не различаем — на Windows это один файл)
+    names = [import_target_name(src) for src in sources]
+    counts = Counter(n.casefold() for n in names)
+    taken = {n for n in counts if counts[n] == 1}
+    try:
+        root = root or os.path.commonpath(sources)
+    except ValueError:
+        # файлы с разных дисков — обойдёмся номером
+        root = None
+    for i, (src, name) in enumerate(zip(sources, names)):
+        if counts[name.casefold()] == 1:
+            continue
+        parts = os.path.relpath(os.path.dirname(src), root).split(os.sep) if root else []
+        prefix = "_".join(p for p in parts if p not in ("", ".", ".."))
+        base = f"{prefix}_{name}" if prefix else name
+        stem = deck_stem(base)
+        cand, k = base, 1
+        while cand.casefold() in taken:
+            k += 1
+            cand = f"{stem}_{k}{base[len(stem):]}"
+        taken.add(cand.casefold())
+        names[i] = cand
+    return names
+
+def import_deck_file(src, name=None, fields=DEFAULT_IMPORT_FIELDS):
+    # (имя файла в WORDS_DIR, ключ ошибки или None, аргументы) — для пула процессов
+    ext  = os.path.splitext(src)[1].lower()
+    name = name or import_target_name(src)
+    if is_deck_file(src):
+        # словарь (в том числе сжатый) копируем как есть
+        err_key, err_args = validate_deck_file(src)
+        if err_key is None:
+            try:
+                shutil.copy(src, os.path.join(WORDS_DIR, name))
+            except Exception as ex:
+                return name, "copy_error", {"error": str(ex)}
+        return name, err_key, err_args
+    dst = os.path.join(WORDS_DIR, name)
+    try:
+        cards = iter_apkg_cards(src, fields) if ext == ".apkg" else iter_csv_cards(src, fields)
+        if not write_deck_stream(dst, deck_stem(name), cards):
+            os.remove(dst)
+            return name, "import_error_no_cards", {}
+    except Exception as ex:
+        try:
+            os.remove(dst + ".tmp")
+        except OSError:
+            pass
+        return name, "import_error_json", {"error": str(ex)}
+    return name, None, {}
+
+
+# ─── Дубликаты в словаре ─────────────────────────────────────────────
+def normalize_key(text):
+    # NFKC + casefold + только буквы/цифры: «Ｎｅｋｏ!» и «neko» — один ключ
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+def find_duplicate_cards(cards):
+    # один проход по хеш-индексу нормализованных слов;
+    # -> (группы индексов длиной > 1, точных дублей, похожих дублей)
+    index, exact_seen = {}, set()
+    exact = near = 0
+    for i, c in enumerate(cards):
+        raw = c["word"].strip().lower()
+        index.setdefault(normalize_key(raw) or raw, []).append(i)
+        if raw in exact_seen:
+            exact += 1
+        else:
+            exact_seen.add(raw)
+    groups = [g for g in index.values() if len(g) > 1]
+    near = sum(len(g) - 1 for g in groups) - exact
+    return groups, exact, near
+
+def _merge_variants(values):
+    # «a, b» + «B, c» -> «a, b, c» (формат, который делит on_answer)
+    out, seen = [], set()
+    for v in values:
+        for part in v.split(","):
+            part = part.strip()
+            k = normalize_key(part) or part.lower()
+            if part and k not in seen:
+                seen.add(k)
+                out.append(part)
+    return ", ".join(out)
+
+def merge_card_group(cards):
+    merged = {"word": cards[0]["word"],
+              "translation": _merge_variants(c["translation"] for c in cards)}
+    rom = _merge_variants(c.get("romaji", "") for c in cards)
+    if rom:
+        merged["romaji"] = rom
+    return merged
+
+
+# ─── Персистентный список для undo в редакторе ───────────────────────
+UNDO_LIMIT = 200   # шагов истории; каждый шаг — O(log n) новых узлов
+
+class _PNode:
+    __slots__ = ("left", "right", "value", "prio", "size")
+
+    def __init__(self, left, right, value, prio):
+        self.left  = left
+        self.right = right
+        self.value = value
+        self.prio  = prio
+        self.size  = 1 + (left.size if left else 0) + (right.size if right else 0)
+
+def _pn_size(n):
+    return n.size if n else 0
+
+def _pn_split(n, k):
+    # (первые k элементов, остальные); копируются только узлы на пути
+    if n is None:
+        return None, None
+    ls = _pn_size(n.left)
+    if k <= ls:
+        a, b = _pn_split(n.left, k)
+        return a, _PNode(b, n.right, n.value, n.prio)
+    a, b = _pn_split(n.right, k - ls - 1)
+    return _PNode(n.left, a, n.value, n.prio), b
+
+def _pn_merge(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.prio > b.prio:
+        return _PNode(a.left, _pn_merge(a.right, b), a.value, a.prio)
+    return _PNode(_pn_merge(a, b.left), b.right, b.value, b.prio)
+
+class PersistentList:
+    # неизменяемый список на декартовом дереве с неявным ключом: set/insert/
+    # delete возвращают новую версию, которая делит с прежней всё, кроме
+    # O(log n) узлов на пути, — поэтому версии можно просто складывать в историю
+    __slots__ = ("_root",)
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @classmethod
+    def from_iter(cls, items):
+        # декартово дерево за O(n): стек правой ветки, случайные приоритеты
+        stack = []
+        for v in items:
+            node = _PNode(None, None, v, random.random())
+            last = None
+            while stack and stack[-1].prio < node.prio:
+                last = stack.pop()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        if not stack:
+            return cls()
+        # размеры поддеревьев — после сборки, снизу вверх
+        order, todo = [], [stack[0]]
+        while todo:
+            n = todo.pop()
+            order.append(n)
+            todo.extend(c for c in (n.left, n.right) if c)
+        for n in reversed(order):
+            n.size = 1 + _pn_size(n.left) + _pn_size(n.right)
+        return cls(stack[0])
+
+    def __len__(self):
+        return _pn_size(self._root)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        n = self._root
+        while True:
+            ls = _pn_size(n.left)
+            if i < ls:
+                n = n.left
+            elif i == ls:
+                return n.value
+            else:
+                i -= ls + 1
+                n = n.right
+
+    def __iter__(self):
+        stack, n = [], self._root
+        while stack or n:
+            while n:
+                stack.append(n)
+                n = n.left
+            n = stack.pop()
+            yield n.value
+            n = n.right
+
+    def set(self, i, value):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        def go(n, i):
+            ls = _pn_size(n.left)
+            if i < ls:
+                return _PNode(go(n.left, i), n.right, n.value, n.prio)
+            if i == ls:
+                return _PNode(n.left, n.right, value, n.prio)
+            return _PNode(n.left, go(n.right, i - ls - 1), n.value, n.prio)
+        return PersistentList(go(self._root, i))
+
+    def insert(self, i, value):
+        a, b = _pn_split(self._root, i)
+        return PersistentList(_pn_merge(_pn_merge(a, _PNode(None, None, value, random.random())), b))
+
+    def delete(self, i):
+        a, b = _pn_split(self._root, i)
+        _, c = _pn_split(b, 1)
+        return PersistentList(_pn_merge(a, c))
+
+
+# ─── Поиск по всем словарям ──────────────────────────────────────────
+SEARCH_DB    = os.path.join(CACHE_DIR, "search.sqlite")
+SEARCH_LIMIT = 50
+
+def _search_norm(text):
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+def _ngrams(text):
+    # символьные биграммы каждого поля — работает для CJK без сегментации;
+    # терминатор в конце поля делает любой символ началом какой-то граммы,
+    # так что запрос из одного символа ищется по префиксу
+    grams = set()
+    for field in text.split("\n"):
+        field += "\x03"
+        grams.update(field[i:i+2] for i in range(len(field) - 1))
+    return grams
+
+class SearchIndex:
+    # инвертированный индекс n-грамм в SQLite; словари переиндексируются
+    # по одному, когда меняется их mtime
+    def __init__(self, path=SEARCH_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS decks(fn TEXT PRIMARY KEY, mtime REAL, title TEXT);
+            CREATE TABLE IF NOT EXISTS cards(id INTEGER PRIMARY KEY, fn TEXT, word TEXT,
+                                             translation TEXT, romaji TEXT, norm TEXT);
+            CREATE INDEX IF NOT EXISTS cards_fn ON cards(fn);
+            CREATE TABLE IF NOT EXISTS grams(gram TEXT, card INTEGER,
+                                             PRIMARY KEY(gram, card)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS gram_df(gram TEXT PRIMARY KEY, n INTEGER) WITHOUT ROWID;
+        """)
+        # поиск идёт по своему соединению: в WAL читатель не ждёт писателя и
+        # видит индекс до начала переиндексации, так что sync() не морозит ввод
+        self.read_lock = threading.Lock()
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+        self.reader.execute("PRAGMA query_only=ON")
+
+    def sync(self):
+        # догоняем папку: новые/изменённые переиндексируем, пропавшие убираем
+        on_disk = {fn for fn in os.listdir(WORDS_DIR) if is_deck_file(fn)}
+        with self.lock:
+            known = dict(self.db.execute("SELECT fn, mtime FROM decks"))
+        for fn in known.keys() - on_disk:
+            self.remove_deck(fn)
+        for fn in on_disk:
+            try:
+                mtime = os.path.getmtime(os.path.join(WORDS_DIR, fn))
+            except OSError:
+                continue
+            if known.get(fn) != mtime:
+                self.update_deck(fn)
+
+    def remove_deck(self, fn):
+        with self.lock, self.db:
+            self._remove(fn)
+
+    def _remove(self, fn):
+        # граммы удаляем по первичному ключу, пересчитывая их из norm
+        rows = self.db.execute("SELECT id, norm FROM cards WHERE fn=?", (fn,)).fetchall()
+        df = Counter()
+        pairs = []
+        for card_id, norm in rows:
+            grams = _ngrams(norm)
+            df.update(grams)
+            pairs.extend((g, card_id) for g in grams)
+        self.db.executemany("DELETE FROM grams WHERE gram=? AND card=?", pairs)
+        self.db.executemany("UPDATE gram_df SET n = n - ? WHERE gram=?",
+                            ((n, g) for g, n in df.items()))
+        self.db.execute("DELETE FROM cards WHERE fn=?", (fn,))
+        self.db.execute("DELETE FROM decks WHERE fn=?", (fn,))
+
+    def update_deck(self, fn):
+        path = os.path.join(WORDS_DIR, fn)
+        try:
+            mtime = os.path.getmtime(path)
+            data = load_deck(path)
+            cards = data.get("cards", [])
+        except Exception:
+            self.remove_deck(fn)
+            return
+        with self.lock, self.db:
+            self._remove(fn)
+            self.db.execute("INSERT INTO decks VALUES (?, ?, ?)",
+                            (fn, mtime, data.get("title", fn)))
+            next_id = self.db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM cards").fetchone()[0]
+            rows, pairs, df = [], [], Counter()
+            for c in cards:
+                if not isinstance(c, dict):
+                    continue
+                fields = [str(c.get(k, "")) for k in ("word", "translation", "romaji")]
+                norm = "\n".join(_search_norm(v) for v in fields)
+                rows.append((next_id, fn, *fields, norm))
+                grams = _ngrams(norm)
+                df.update(grams)
+                pairs.extend((g, next_id) for g in grams)
+                next_id += 1
+            self.db.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?)", rows)
+            # отсортированная вставка идёт в B-дерево последовательно
+            pairs.sort()
+            self.db.executemany("INSERT INTO grams VALUES (?, ?)", pairs)
+            self.db.executemany(
+                "INSERT INTO gram_df VALUES (?, ?) ON CONFLICT(gram) DO UPDATE SET n = n + excluded.n",
+                df.items())
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        # -> [(fn, title, word, translation, romaji)]
+        q = _search_norm(query)
+        if not q:
+            return []
+        with self.read_lock:
+            if len(q) == 1:
+                sql = ("SELECT DISTINCT c.fn, d.title, c.word, c.translation, c.romaji FROM grams g "
+                       "JOIN cards c ON c.id = g.card JOIN decks d ON d.fn = c.fn "
+                       "WHERE g.gram >= ? AND g.gram < ? LIMIT ?")
+                return self.reader.execute(sql, (q, q + "\U0010ffff", limit)).fetchall()
+            grams = list({q[i:i+2] for i in range(len(q) - 1)})
+            df = dict(self.reader.execute(
+                f"SELECT gram, n FROM gram_df WHERE gram IN ({','.join('?' * len(grams))})", grams))
+            if len(df) < len(grams) or not all(df.values()):
+                return []
+            # идём по самому редкому постинг-листу, остальные граммы — точечные
+            # проверки по первичному ключу; LIMIT обрывает проход досрочно
+            grams.sort(key=df.get)
+            checks = " ".join("AND EXISTS (SELECT 1 FROM grams WHERE gram=? AND card=g.card)"
+                              for _ in grams[1:4])
+            sql = (f"SELECT c.fn, d.title, c.word, c.translation, c.romaji FROM grams g "
+                   f"JOIN cards c ON c.id = g.card JOIN decks d ON d.fn = c.fn "
+                   f"WHERE g.gram=? {checks} AND instr(c.norm, ?) > 0 LIMIT ?")
+            return self.reader.execute(sql, (*grams[:4], q, limit)).fetchall()
+
+
+# ─── Кана -> ромадзи ──────────────────────────────────────────────────
+ROMAJI_SYSTEMS = ("hepburn", "kunrei")
+
+def _kana_tables():
+    # кунрэй-сики строится систематически, хэпбёрн — поверх него
+    rows = {
+        "": "あいうえお", "k": "かきくけこ", "s": "さしすせそ", "t": "たちつてと",
+        "n": "なにぬねの", "h": "はひふへほ", "m": "まみむめも", "y": "や\0ゆ\0よ",
+        "r": "らりるれろ", "w": "わ\0\0\0を", "g": "がぎぐげご", "z": "ざじずぜぞ",
+        "d": "だぢづでど", "b": "ばびぶべぼ", "p": "ぱぴぷぺぽ",
+    }
+    kunrei = {}
+    for cons, kana in rows.items():
+        for ch, vowel in zip(kana, "aiueo"):
+            if ch != "\0":
+                kunrei[ch] = cons + vowel
+    kunrei.update({"を": "o", "ぢ": "zi", "づ": "zu", "ん": "n", "ゔ": "vu",
+                   "ぁ": "a", "ぃ": "i", "ぅ": "u", "ぇ": "e", "ぉ": "o",
+                   "ゃ": "ya", "ゅ": "yu", "ょ": "yo", "ゎ": "wa",
+                   "、": ", ", "。": ". ", "・": " ", "　": " "})
+    # ёон: слог на -i + маленькие ゃゅょ
+    for ch in "きしちにひみりぎじぢびぴ":
+        cons = kunrei[ch][:-1]
+        for small, v in zip("ゃゅょ", "auo"):
+            kunrei[ch + small] = cons + "y" + v
+    hepburn = dict(kunrei)
+    hepburn.update({"し": "shi", "ち": "chi", "つ": "tsu", "ふ": "fu", "じ": "ji", "ぢ": "ji"})
+    for small, v in zip("ゃゅょ", "auo"):
+        hepburn["し" + small] = "sh" + v
+        hepburn["ち" + small] = "ch" + v
+        hepburn["じ" + small] = "j" + v
+        hepburn["ぢ" + small] = "j" + v
+    # заимствования (после перевода катаканы в хирагану)
+    extra = {"ふぁ": "fa", "ふぃ": "fi", "ふぇ": "fe", "ふぉ": "fo", "てぃ": "ti", "でぃ": "di",
+             "とぅ": "tu", "どぅ": "du", "うぃ": "wi", "うぇ": "we", "うぉ": "wo",
+             "ゔぁ": "va", "ゔぃ": "vi", "ゔぇ": "ve", "ゔぉ": "vo"}
+    hepburn.update(extra)
+    hepburn.update({"しぇ": "she", "ちぇ": "che", "じぇ": "je"})
+    kunrei.update(extra)
+    kunrei.update({"しぇ": "sye", "ちぇ": "tye", "じぇ": "zye"})
+    return {"hepburn": hepburn, "kunrei": kunrei}
+
+def _build_trie(table):
+    root = {}
+    for kana, rom in table.items():
+        node = root
+        for ch in kana:
+            node = node.setdefault(ch, {})
+        node[""] = rom
+    return root
+
+_KANA_TRIES = {name: _build_trie(t) for name, t in _kana_tables().items()}
+
+def _to_hiragana(text):
+    return "".join(chr(ord(ch) - 0x60) if "ァ" <= ch <= "ヶ" else ch for ch in text)
+
+@lru_cache(maxsize=65536)
+def kana_to_romaji(text, system="hepburn"):
+    # самое длинное совпадение по трие; None, если в тексте есть кандзи и т.п.
+    trie = _KANA_TRIES.get(system, _KANA_TRIES["hepburn"])
+    text = _to_hiragana(unicodedata.normalize("NFKC", text).strip())
+    out, i, sokuon, kana_seen = [], 0, False, False
+    while i < len(text):
+        ch = text[i]
+        if ch == "っ":
+            sokuon = True
+            i += 1
+            continue
+        if ch == "ー":
+            # долгий звук — повторяем последнюю гласную
+            last = next((c for c in reversed("".join(out)) if c in "aiueo"), "")
+            out.append(last)
+            i += 1
+            continue
+        node, j, rom = trie, i, None
+        while j < len(text) and text[j] in node:
+            node = node[text[j]]
+            j += 1
+            if "" in node:
+                rom, end = node[""], j
+        if rom is None:
+            if ch.isalpha() and not ch.isascii():
+                return None
+            rom, end = ch, i + 1
+        else:
+            kana_seen = True
+        if sokuon and rom[:1].isalpha() and rom[0] not in "aiueo":
+            rom = ("t" if rom.startswith("ch") else rom[0]) + rom
+        sokuon = False
+        # ん перед гласной или y: «kin'en», «kon'ya»
+        if i and text[i - 1] == "ん" and rom[:1] in ("a", "i", "u", "e", "o", "y"):
+            out[-1] = "n'"
+        out.append(rom)
+        i = end
+    if not kana_seen:
+        return None
+    return " ".join("".join(out).split()) or None
+
+def fill_romaji(cards, system="hepburn"):
+    # дописываем ромадзи только там, где его нет; карточки могут быть общими
+    # (read-only) между сессиями, поэтому изменённые копируем
+    out = []
+    for c in cards:
+        if not c.get("romaji", "").strip():
+            rom = kana_to_romaji(c.get("word", ""), system)
+            if rom:
+                c = {**c, "romaji": rom}
+        out.append(c)
+    return out
+
+
+# ─── Словарь на mmap с индексом смещений ─────────────────────────────
+OFFSETS_DIR = os.path.join(CACHE_DIR, "offsets")
+WORDS_PAGE  = 200   # карточек на страницу в show_words
+
+_JSON_TOKEN  = re.compile(rb'[{}\[\]"]')
+_JSON_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.S)
+# плоская карточка без вложенных объектов — целиком одним проходом регэкспа
+_FLAT_OBJECT = re.compile(rb'\{(?:[^{}\[\]"]|"(?:[^"\\]|\\.)*")*\}', re.S)
+_JSON_WS     = re.compile(rb'\s*')
+
+def _scan_deck(buf):
+    # -> (заголовок {title, sentence_mode}, array('Q') [start0, end0, start1, end1, ...])
+    header, offsets = {}, array("Q")
+    stack, cards_level, card_start, pos = 0, None, None, 0
+    while True:
+        m = _JSON_TOKEN.search(buf, pos)
+        if m is None:
+            break
+        p = m.start()
+        ch = buf[p:p+1]
+        if ch == b'"':
+            st = _JSON_STRING.match(buf, p)
+            if st is None:
+                raise ValueError("unterminated string at %d" % p)
+            pos = st.end()
+            colon = _JSON_WS.match(buf, pos).end()
+            if stack == 1 and buf[colon:colon+1] == b":":
+                # ключ верхнего уровня
+                key = json.loads(st.group())
+                v = _JSON_WS.match(buf, colon + 1).end()
+                if key == "cards" and buf[v:v+1] == b"[":
+                    stack, cards_level, pos = 2, 2, v + 1
+                elif key == "title" and buf[v:v+1] == b'"':
+                    tv = _JSON_STRING.match(buf, v)
+                    header["title"] = json.loads(tv.group())
+                    pos = tv.end()
+                elif key == "sentence_mode":
+                    header["sentence_mode"] = buf[v:v+4] == b"true"
+            continue
+        if ch in (b"{", b"["):
+            if stack == cards_level and ch == b"{":
+                flat = _FLAT_OBJECT.match(buf, p)
+                if flat:
+                    offsets.extend((p, flat.end()))
+                    pos = flat.end()
+                    continue
+                card_start = p
+            stack += 1
+        else:
+            stack -= 1
+            if cards_level is not None:
+                if stack == cards_level and ch == b"}":
+                    offsets.extend((card_start, p + 1))
+                elif stack < cards_level:
+                    cards_level = None
+        pos = p + 1
+    return header, offsets
+
+def _plain_deck(path):
+    # mmap нужен несжатый файл: сжатый словарь потоком распаковываем в кеш,
+    # mtime копии = mtime исходника, по нему и проверяем свежесть
+    if deck_format(path) == "json":
+        return path
+    st = os.stat(path)
+    plain = os.path.join(OFFSETS_DIR, hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest() + ".json")
+    try:
+        if os.stat(plain).st_mtime_ns == st.st_mtime_ns:
+            return plain
+    except OSError:
+        pass
+    os.makedirs(OFFSETS_DIR, exist_ok=True)
+    tmp = plain + ".tmp"
+    with open_deck(path) as src, open(tmp, "w", encoding="utf-8") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp, plain)
+    return plain
+
+def _offsets_path(path):
+    return os.path.join(OFFSETS_DIR, hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest() + ".idx")
+
+class MappedDeck:
+    # read-only словарь: файл отображён в память, индекс границ карточек
+    # лежит в кеше (тоже через mmap), карточка декодируется по запросу
+    def __init__(self, path):
+        self.path = _plain_deck(path)
+        self._f   = open(self.path, "rb")
+        self._mm  = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        st = os.fstat(self._f.fileno())
+        self._idx_f = self._idx_mm = None
+        header = self._load_index(st)
+        if header is None:
+            header, offsets = _scan_deck(self._mm)
+            self._offsets = offsets
+            self._save_index(st, header, offsets)
+        self.title         = header.get("title", deck_stem(path))
+        self.sentence_mode = header.get("sentence_mode", False)
+
+    def _load_index(self, st):
+        try:
+            f = open(_offsets_path(self.path), "rb")
+        except OSError:
+            return None
+        # битый или недописанный индекс — просто строим заново
+        mm = view = None
+        try:
+            header = json.loads(f.readline())
+            if (not isinstance(header, dict) or header.get("size") != st.st_size
+                    or header.get("mtime_ns") != st.st_mtime_ns):
+                raise ValueError("stale index")
+            mm   = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)[header["data"]:].cast("Q")
+            if len(view) != header.get("count"):
+                raise ValueError("truncated index")
+        except (ValueError, TypeError, KeyError):
+            if view is not None:
+                view.release()
+            if mm is not None:
+                mm.close()
+            f.close()
+            return None
+        self._idx_f, self._idx_mm, self._offsets = f, mm, view
+        return header
+
+    def _save_index(self, st, header, offsets):
+        meta = dict(header, size=st.st_size, mtime_ns=st.st_mtime_ns, count=len(offsets))
+        line = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        # данные выравниваем на 8 байт, чтобы читать их через cast("Q")
+        data = (len(line) + 1 + 20 + 7) // 8 * 8
+        meta["data"] = data
+        line = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(OFFSETS_DIR, exist_ok=True)
+            tmp = _offsets_path(self.path) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(line.ljust(data - 1) + b"\n")
+                offsets.tofile(f)
+            os.replace(tmp, _offsets_path(self.path))
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self._offsets) // 2
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self._mm[self._offsets[2*i]:self._offsets[2*i + 1]])
+
+    def page(self, n, size=WORDS_PAGE):
+        return [self[i] for i in range(n * size, min(len(self), (n + 1) * size))]
+
+    def close(self):
+        # на Windows отображённый файл нельзя перезаписать — закрываем сразу
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        for obj in (self._idx_mm, self._idx_f, self._mm, self._f):
+            if obj is not None:
+                obj.close()
+
+
+# ─── Профили пользователей ───────────────────────────────────────────
+PROFILE_COUNTERS = ("tests_taken", "correct_answers", "total_questions")
+# дашборд статистики: окно в днях и длина списка частых ошибок
+STATS_DAYS = 30
+STATS_TOP  = 10
+LOCAL_USER       = "local"
+
+class ProfileStore:
+    # SQLite в WAL: читатели не блокируют писателя, запись — короткие
+    # транзакции; у каждого потока своё соединение, общего замка нет
+    def __init__(self, path=PROFILES_DB):
+        self.path   = path
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        with db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS settings(user TEXT, key TEXT, value TEXT,
+                                                    PRIMARY KEY(user, key)) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS counters(user TEXT, name TEXT, n INTEGER NOT NULL,
+                                                    PRIMARY KEY(user, name)) WITHOUT ROWID;
+                -- агрегаты статистики, обновляются по концу теста
+                CREATE TABLE IF NOT EXISTS daily(user TEXT, day TEXT, deck TEXT,
+                                                 sessions INTEGER, answers INTEGER,
+                                                 correct INTEGER, first_try INTEGER,
+                                                 PRIMARY KEY(user, day, deck)) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS missed(user TEXT, deck TEXT, word TEXT, n INTEGER,
+                                                  PRIMARY KEY(user, deck, word)) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS missed_top  ON missed(user, n);
+                CREATE INDEX IF NOT EXISTS missed_deck ON missed(user, deck, n);
+                -- веса карточек для адаптивного режима
+                CREATE TABLE IF NOT EXISTS weights(user TEXT, deck TEXT, word TEXT, w REAL,
+                                                   PRIMARY KEY(user, deck, word)) WITHOUT ROWID;
+            """)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def load(self, user):
+        db = self._db()
+        data = {k: json.loads(v) for k, v in
+                db.execute("SELECT key, value FROM settings WHERE user=?", (user,))}
+        data.update(db.execute("SELECT name, n FROM counters WHERE user=?", (user,)))
+        return data
+
+    def save(self, user, values):
+        # пишем только переданные ключи — чужие изменения не затираются
+        with self._db() as db:
+            db.executemany(
+                "INSERT INTO settings VALUES (?, ?, ?) "
+                "ON CONFLICT(user, key) DO UPDATE SET value = excluded.value",
+                ((user, k, json.dumps(v, ensure_ascii=False)) for k, v in values.items()))
+
+    def seed_counters(self, user, values):
+        with self._db() as db:
+            db.executemany("INSERT OR IGNORE INTO counters VALUES (?, ?, ?)",
+                           ((user, k, int(v)) for k, v in values.items()))
+
+    def incr(self, user, name, delta=1):
+        # атомарно в одной транзакции, возвращает новое значение
+        with self._db() as db:
+            db.execute("INSERT INTO counters VALUES (?, ?, ?) "
+                       "ON CONFLICT(user, name) DO UPDATE SET n = n + excluded.n",
+                       (user, name, delta))
+            return db.execute("SELECT n FROM counters WHERE user=? AND name=?",
+                              (user, name)).fetchone()[0]
+
+    def record_session(self, user, day, rows):
+        # строки результата (как в истории) -> +1 сессия в корзину (день, словарь)
+        # и счётчики ошибок по карточкам
+        buckets, missed = {}, Counter()
+        for r in rows:
+            ok = r["status"] != "wrong"
+            b = buckets.setdefault(r["deck"], [0, 0, 0])
+            b[0] += 1
+            b[1] += ok
+            b[2] += r["status"] == "correct"
+            errors = max(r["attempts"] - ok, not ok)
+            if errors:
+                missed[(r["deck"], r["word"])] += errors
+        with self._db() as db:
+            db.executemany(
+                "INSERT INTO daily VALUES (?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT(user, day, deck) DO UPDATE SET sessions = sessions + 1, "
+                "answers = answers + excluded.answers, correct = correct + excluded.correct, "
+                "first_try = first_try + excluded.first_try",
+                ((user, day, deck, *b) for deck, b in buckets.items()))
+            db.executemany(
+                "INSERT INTO missed VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user, deck, word) DO UPDATE SET n = n + excluded.n",
+                ((user, deck, word, n) for (deck, word), n in missed.items()))
+
+    def weights(self, user, deck):
+        return dict(self._db().execute("SELECT word, w FROM weights WHERE user=? AND deck=?",
+                                       (user, deck)))
+
+    def update_weights(self, user, deck, outcomes):
+        # [(word, attempts, correct)] -> {word: новый вес}; трогаем только эти строки
+        out = {}
+        with self._db() as db:
+            for word, attempts, correct in outcomes:
+                row = db.execute("SELECT w FROM weights WHERE user=? AND deck=? AND word=?",
+                                 (user, deck, word)).fetchone()
+                w = out[word] = next_weight(row[0] if row else WEIGHT_NEW, attempts, correct)
+                db.execute("INSERT OR REPLACE INTO weights VALUES (?, ?, ?, ?)", (user, deck, word, w))
+        return out
+
+    def has_stats(self, user):
+        return self._db().execute("SELECT 1 FROM daily WHERE user=? LIMIT 1",
+                                  (user,)).fetchone() is not None
+
+    def stats(self, user, since, deck=None, top=STATS_TOP):
+        # только окно с since и топ по индексу — объём истории не важен
+        db = self._db()
+        daily = db.execute("SELECT day, deck, sessions, answers, correct, first_try "
+                           "FROM daily WHERE user=? AND day>=? ORDER BY day",
+                           (user, since)).fetchall()
+        if deck:
+            missed = db.execute("SELECT deck, word, n FROM missed WHERE user=? AND deck=? "
+                                "ORDER BY n DESC LIMIT ?", (user, deck, top)).fetchall()
+        else:
+            missed = db.execute("SELECT deck, word, n FROM missed WHERE user=? "
+                                "ORDER BY n DESC LIMIT ?", (user, top)).fetchall()
+        counters = dict(db.execute("SELECT name, n FROM counters WHERE user=?", (user,)))
+        return daily, missed, counters
+
+
+# ─── Адаптивный режим: слабые карточки чаще ──────────────────────────
+ADAPTIVE_SESSION = 20     # карточек в адаптивном тесте по умолчанию
+WEIGHT_NEW       = 1.0    # вес ещё не встречавшейся карточки
+WEIGHT_DECAY     = 0.5    # после теста: w = w * DECAY + число ошибок
+WEIGHT_MIN       = 0.05   # выученная карточка всё же иногда попадается
+
+def next_weight(w, attempts, correct):
+    errors = attempts - 1 if correct else max(attempts, 1)
+    return max(WEIGHT_MIN, w * WEIGHT_DECAY + errors)
+
+class WeightedSampler:
+    # выборка с весами без перестроения: индексы лежат в корзинах по степени
+    # двойки (w в [2^(k-1), 2^k)), корзина выбирается по сумме весов, внутри —
+    # случайный индекс с отбором по w / 2^k (принимается с вероятностью ≥ 1/2).
+    # Корзин единицы, так что и выбор, и смена веса — O(1)
+    def __init__(self, weights):
+        self.w        = list(weights)
+        self._pos     = [0] * len(self.w)
+        self._buckets = {}   # k -> [индексы]
+        self._totals  = {}   # k -> сумма весов корзины
+        for i in range(len(self.w)):
+            self._add(i)
+
+    def __len__(self):
+        return sum(len(b) for b in self._buckets.values())
+
+    def _add(self, i):
+        w = self.w[i]
+        if w <= 0:
+            return
+        k = math.frexp(w)[1]
+        b = self._buckets.setdefault(k, [])
+        self._pos[i] = len(b)
+        b.append(i)
+        self._totals[k] = self._totals.get(k, 0.0) + w
+
+    def _remove(self, i):
+        w = self.w[i]
+        if w <= 0:
+            return
+        k = math.frexp(w)[1]
+        b = self._buckets[k]
+        last = b.pop()
+        if last != i:
+            b[self._pos[i]] = last
+            self._pos[last] = self._pos[i]
+        if b:
+            self._totals[k] -= w
+        else:
+            del self._buckets[k], self._totals[k]
+
+    def update(self, i, w):
+        self._remove(i)
+        self.w[i] = w
+        self._add(i)
+
+    def draw(self, rng=random):
+        r = rng.random() * sum(self._totals.values())
+        for k, total in self._totals.items():
+            r -= total
+            if r < 0:
+                break
+        b, cap = self._buckets[k], 2.0 ** k
+        while True:
+            i = b[int(rng.random() * len(b))]
+            if rng.random() * cap < self.w[i]:
+                return i
+
+    def sample(self, n, rng=random):
+        # без повторов: вынутой карточке на время ставим вес 0
+        picked = []
+        for _ in range(min(n, len(self))):
+            i = self.draw(rng)
+            picked.append((i, self.w[i]))
+            self.update(i, 0.0)
+        for i, w in picked:
+            self.update(i, w)
+        return [i for i, _ in picked]
+
+
+# ─── История тестов и экспорт результатов ────────────────────────────
+RESULT_FIELDS = ("session", "deck", "word", "expected", "entered", "attempts", "status")
+
+def result_status(r):
+    # машиночитаемый аналог 🟢 / 🔴N / ❌
+    if not r["correct"]:
+        return "wrong"
+    return "correct" if r["attempts"] == 1 else "corrected"
+
+def history_path(user_id):
+    return os.path.join(HISTORY_DIR, re.sub(r"[^\w-]", "_", user_id) + ".jsonl")
+
+def append_history(user_id, rows):
+    # одна строка JSON на карточку; сессия дописывается одним write()
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    chunk = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+    with open(history_path(user_id), "a", encoding="utf-8") as f:
+        f.write(chunk)
+
+def iter_history(user_id):
+    try:
+        f = open(history_path(user_id), encoding="utf-8")
+    except OSError:
+        return
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# ─── Незаконченный тест: заголовок + дельты по ответам ────────────────
+def session_path(user_id):
+    return os.path.join(SESSIONS_DIR, re.sub(r"[^\w-]", "_", user_id) + ".jsonl")
+
+class SessionJournal:
+    # первая строка — заголовок (словарь, порядок карточек индексами, режимы),
+    # дальше на каждый ответ короткая строка [idx, attempts, correct, entered];
+    # header=None — дописываем в уже начатый журнал
+    def __init__(self, user_id, header=None):
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        self.path = session_path(user_id)
+        self._f = open(self.path, "a" if header is None else "w", encoding="utf-8")
+        if header is not None:
+            self._f.write(json.dumps(header, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._f.flush()
+
+    def answer(self, idx, attempts, correct, entered):
+        self._f.write(json.dumps([idx, attempts, int(correct), entered],
+                                 ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._f.flush()
+
+    def close(self, done=False):
+        # done — тест дошёл до результатов, продолжать нечего
+        if not self._f.closed:
+            self._f.close()
+        if done:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+def load_session(user_id):
+    # -> (заголовок, {idx: (attempts, correct, entered)}) или None;
+    #    оборванная последняя строка (упали посреди записи) пропускается
+    try:
+        f = open(session_path(user_id), encoding="utf-8")
+    except OSError:
+        return None
+    answers = {}
+    with f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            return None
+        for line in f:
+            try:
+                idx, attempts, correct, entered = json.loads(line)
+            except ValueError:
+                continue
+            answers[idx] = (attempts, bool(correct), entered)
+    return header, answers
+
+def write_results(path, rows):
+    # потоково, по строке за раз: CSV или JSON-массив — по расширению
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".json"):
+            f.write("[")
+            for i, r in enumerate(rows):
+                f.write(("," if i else "") + "\n  " + json.dumps(r, ensure_ascii=False))
+            f.write("\n]\n")
+        else:
+            w = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            w.writeheader()
+            for r in rows:
+                w.writerow(r)
+
+
+# ─── Иконки: варианты по размерам с хешем в имени ────────────────────
+ICON_SIZES    = (16, 32, 48, 64, 128, 192, 256, 512)
+FAVICON_SIZES = (16, 32, 48, 256)
+ICON_SS       = 4   # выборок на сторону пикселя при уменьшении без Pillow
+# файлы с фиксированными именами, которые веб-оболочка flet берёт из assets —
+# так браузер и получает подходящий размер; окно десктопа — из .ico
+ICON_ALIASES  = {"favicon.png": 32, "icons/Icon-192.png": 192,
+                 "icons/Icon-512.png": 512, "icons/apple-touch-icon-192.png": 192}
+
+def _png_decode(data):
+    # только 8-битные RGB/RGBA без чересстрочности — иначе ValueError
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("not a png")
+    pos, idat = 8, []
+    while pos < len(data):
+        n, typ = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + n]
+        pos += 12 + n
+        if typ == b"IHDR":
+            w, h, depth, ctype, _, _, interlace = struct.unpack(">IIBBBBB", body)
+            if depth != 8 or ctype not in (2, 6) or interlace:
+                raise ValueError("unsupported png")
+            ch = 3 if ctype == 2 else 4
+        elif typ == b"IDAT":
+            idat.append(body)
+        elif typ == b"IEND":
+            break
+    raw = zlib.decompress(b"".join(idat))
+    stride = w * ch
+    rows, prev = [], bytes(stride)
+    for y in range(h):
+        ft = raw[y * (stride + 1)]
+        line = raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)]
+        if ft:
+            line = bytearray(line)
+            for i in range(stride):
+                a = line[i - ch] if i >= ch else 0
+                b = prev[i]
+                if ft == 1:
+                    line[i] = (line[i] + a) & 255
+                elif ft == 2:
+                    line[i] = (line[i] + b) & 255
+                elif ft == 3:
+                    line[i] = (line[i] + ((a + b) >> 1)) & 255
+                else:
+                    c = prev[i - ch] if i >= ch else 0
+                    p = a + b - c
+                    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                    pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                    line[i] = (line[i] + pred) & 255
+            line = bytes(line)
+        rows.append(line)
+        prev = line
+    return w, h, ch, rows
+
+def _png_encode(size, ch, rows):
+    def chunk(typ, body):
+        return struct.pack(">I", len(body)) + typ + body + struct.pack(">I", zlib.crc32(typ + body))
+    ihdr = struct.pack(">IIBBBBB", size, size, 8, 2 if ch == 3 else 6, 0, 0, 0)
+    raw = b"".join(b"\0" + r for r in rows)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr)
+            + chunk(b"IDAT", zlib.compress(raw, 9)) + chunk(b"IEND", b""))
+
+def _shrink(w, h, ch, rows, size, ss=ICON_SS):
+    # среднее по ss×ss точкам внутри каждого пикселя; выборка столбцов
+    # через itemgetter, чтобы не крутить цикл по пикселям в питоне
+    cols = []
+    for j in range(ss):
+        idx = []
+        for x in range(size):
+            sx = min(w - 1, int((x + (j + 0.5) / ss) * w / size))
+            idx.extend(range(sx * ch, sx * ch + ch))
+        cols.append(itemgetter(*idx))
+    n, out = ss * ss, []
+    for y in range(size):
+        samples = []
+        for i in range(ss):
+            row = rows[min(h - 1, int((y + (i + 0.5) / ss) * h / size))]
+            samples.extend(g(row) for g in cols)
+        out.append(bytes((v + n // 2) // n for v in map(sum, zip(*samples))))
+    return out
+
+def _icon_variants(src, sizes):
+    if Image is not None:
+        out = {}
+        with Image.open(src) as im:
+            im = im.convert("RGBA")
+            for size in sizes:
+                buf = io.BytesIO()
+                im.resize((size, size), Image.LANCZOS).save(buf, "PNG", optimize=True)
+                out[size] = buf.getvalue()
+        return out
+    with open(src, "rb") as f:
+        w, h, ch, rows = _png_decode(f.read())
+    # каскадом от большего к меньшему: каждый шаг уменьшает немного
+    out = {}
+    for size in sorted(sizes, reverse=True):
+        rows = _shrink(w, h, ch, rows, size)
+        w = h = size
+        out[size] = _png_encode(size, ch, rows)
+    return out
+
+def _ico_from_pngs(pngs):
+    # ICO с PNG внутри (Vista+), по записи на размер
+    head = struct.pack("<HHH", 0, 1, len(pngs))
+    off, entries = 6 + 16 * len(pngs), []
+    for size, data in pngs:
+        entries.append(struct.pack("<BBBBHHII", size % 256, size % 256, 0, 0, 1, 32, len(data), off))
+        off += len(data)
+    return head + b"".join(entries) + b"".join(d for _, d in pngs)
+
+def _write_if_changed(path, data):
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def build_icon_assets(src=ICON_FILE, out_dir=ICON_DIR):
+    # 1) исходник не менялся (размер+mtime или хеш) — берём манифест как есть
+    man_path = os.path.join(out_dir, "manifest.json")
+    st = os.stat(src)
+    stamp = [st.st_size, st.st_mtime_ns]
+    try:
+        with open(man_path, encoding="utf-8") as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+    if old.get("stamp") == stamp:
+        return old
+    h = hashlib.sha1()
+    with open(src, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    if old.get("source") == digest:
+        old["stamp"] = stamp
+        _write_if_changed(man_path, json.dumps(old).encode("utf-8"))
+        return old
+
+    # 2) режем варианты, имя = размер + хеш содержимого
+    pngs = _icon_variants(src, ICON_SIZES)
+    os.makedirs(out_dir, exist_ok=True)
+    sizes = {}
+    for size, data in pngs.items():
+        name = f"icon-{size}.{hashlib.sha1(data).hexdigest()[:10]}.png"
+        _write_if_changed(os.path.join(out_dir, name), data)
+        sizes[str(size)] = name
+    ico = _ico_from_pngs([(s, pngs[s]) for s in FAVICON_SIZES])
+    ico_name = f"favicon.{hashlib.sha1(ico).hexdigest()[:10]}.ico"
+    _write_if_changed(os.path.join(out_dir, ico_name), ico)
+
+    # 3) фиксированные имена для веб-оболочки
+    assets = os.path.dirname(out_dir)
+    for rel, size in ICON_ALIASES.items():
+        _write_if_changed(os.path.join(assets, *rel.split("/")), pngs[size])
+
+    # 4) манифест и уборка старых вариантов
+    manifest = {"source": digest, "stamp": stamp, "sizes": sizes, "ico": ico_name}
+    _write_if_changed(man_path, json.dumps(manifest).encode("utf-8"))
+    keep = set(sizes.values()) | {ico_name}
+    for fn in os.listdir(out_dir):
+        if re.fullmatch(r"(icon-\d+|favicon)\.[0-9a-f]{10}\.(png|ico)", fn) and fn not in keep:
+            try:
+                os.remove(os.path.join(out_dir, fn))
+            except OSError:
+                pass
+    return manifest
+
+@lru_cache(maxsize=1)
+def icon_manifest():
+    try:
+        return build_icon_assets()
+    except (OSError, ValueError, zlib.error):
+        # нет прав на запись или непонятный формат — живём с исходным файлом
+        return {}
+
+def window_icon_file():
+    ico = icon_manifest().get("ico")
+    return os.path.join(ICON_DIR, ico) if ico else ICON_FILE
+
+
+# ─── Отложенные действия UI ──────────────────────────────────────────
+class Scheduler:
+    # один поток-таймер на процесс вместо потока на каждый клик: куча
+    # (время, seq, ключ); повторный call_later с тем же ключом переносит
+    # задачу, а устаревшие записи кучи просто пропускаются
+    def __init__(self):
+        self._cv     = threading.Condition()
+        self._heap   = []
+        self._tasks  = {}   # key -> (when, seq, fn)
+        self._seq    = itertools.count()
+        self._thread = None
+
+    def call_later(self, delay, fn, key=None):
+        if key is None:
+            key = object()
+        with self._cv:
+            when = time.monotonic() + delay
+            seq = next(self._seq)
+            self._tasks[key] = (when, seq, fn)
+            heapq.heappush(self._heap, (when, seq, key))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cv.notify()
+        return key
+
+    def cancel(self, key):
+        with self._cv:
+            return self._tasks.pop(key, None) is not None
+
+    def pending(self, key):
+        with self._cv:
+            return key in self._tasks
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while True:
+                    if not self._heap:
+                        self._cv.wait()
+                        continue
+                    when, seq, key = self._heap[0]
+                    task = self._tasks.get(key)
+                    if task is None or task[1] != seq:
+                        # отменена или перенесена
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = when - time.monotonic()
+                    if delay > 0:
+                        self._cv.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    del self._tasks[key]
+                    fn = task[2]
+                    break
+            try:
+                fn()
+            except Exception:
+                traceback.print_exc()
+
+SCHEDULER = Scheduler()
+# пауза после выбора словаря перед фоновой подготовкой (гасит дребезг выпадашки)
+PREFETCH_DELAY = 0.3
+# заранее готовим карточки только первого экрана, остальные — по Start
+PREFETCH_FIRST_SCREEN = 40
+
+
+# ─── Пул контролов карточек ──────────────────────────────────────────
+# сколько свободных карточек пул держит про запас (лишние отдаются GC)
+# столько свободных карточек держим между тестами; лишние отдаём сборщику
+CONTROL_POOL_LIMIT = 200
+
+class ControlPool:
+    # карточки не создаются заново на каждый тест/страницу, а перепривязываются
+    # к новым данным: те же объекты на тех же местах — клиенту уходят только
+    # изменённые свойства. Карточка пула живёт только в одном лэйауте.
+    def __init__(self, factory, limit=CONTROL_POOL_LIMIT):
+        self._factory = factory
+        self._limit   = limit
+        self._free    = []
+        self._lock    = threading.Lock()
+
+    def reserve(self, n):
+        # можно из фонового потока: новые карточки ещё ни к чему не привязаны
+        with self._lock:
+            missing = min(n, self._limit) - len(self._free)
+        if missing > 0:
+            fresh = [self._factory() for _ in range(missing)]
+            with self._lock:
+                self._free.extend(fresh)
+
+    def acquire(self, n):
+        # в том же порядке, в каком отдали, — лэйаут не перестраивается
+        with self._lock:
+            got = self._free[:n]
+            del self._free[:n]
+        got += [self._factory() for _ in range(n - len(got))]
+        return got
+
+    def release(self, items):
+        with self._lock:
+            self._free[:0] = items[:max(0, self._limit - len(self._free))]
+
+    def idle(self):
+        with self._lock:
+            return list(self._free)
+
+
+# ─── Профиль памяти: KOTOYON_MEMPROFILE=1 или python mineWin.py --memprofile ──
+MEMPROFILE_ENV    = "KOTOYON_MEMPROFILE"
+MEMPROFILE_TOP    = 10
+# глубины хватает, чтобы из недр flet дойти до строки в mineWin.py
+MEMPROFILE_FRAMES = 25
+# экраны, которые меряем, и сколько карточек на них вышло
+MEMPROFILE_PAGES = {
+    "start_test":         lambda app: len(app.fields),
+    "resume_test":        lambda app: len(app.fields),
+    "show_results":       lambda app: len(app._slots["results"]),
+    "show_words":         lambda app: len(app._slots["words"]),
+    "_words_goto":        lambda app: len(app._slots["words"]),
+    "load_selected_dict": lambda app: len(app.word_inputs),
+}
+
+def memprofile_enabled():
+    return os.environ.get(MEMPROFILE_ENV, "") not in ("", "0")
+
+def _kib(n):
+    return f"{n / 1024:+,.1f} KiB"
+
+class MemProfiler:
+    # снимки tracemalloc до и после постройки экрана: что осталось жить
+    # (retained), пик, самые тяжёлые места по строкам mineWin.py и утечки
+    # между тестами подряд. Отчёт — в stderr.
+    def __init__(self, app, out=None):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMPROFILE_FRAMES)
+        self.app  = app
+        self.out  = out or sys.stderr
+        self._tests        = 0
+        self._prev_traced  = None
+        self._prev_overlay = None
+        self._prev_fields  = []   # weakref на поля прошлого теста
+
+    def wrap(self, name, fn):
+        count = MEMPROFILE_PAGES[name]
+        def measured(*a, **kw):
+            gc.collect()
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            try:
+                return fn(*a, **kw)
+            finally:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                gc.collect()
+                self.report(name, count(self.app), before, tracemalloc.take_snapshot(), peak)
+                if name in ("start_test", "resume_test"):
+                    self.check_leaks()
+        return measured
+
+    def _say(self, line):
+        print(f"[mem] {line}", file=self.out, flush=True)
+
+    def report(self, name, cards, before, after, peak):
+        # места выделения сводим к ближайшей строке нашего модуля
+        sites = Counter()
+        retained = 0
+        for st in after.compare_to(before, "traceback"):
+            retained += st.size_diff
+            frame = next((f for f in reversed(st.traceback) if f.filename == __file__),
+                         st.traceback[-1])
+            sites[(frame.filename, frame.lineno)] += st.size_diff
+        per_card = f", {_kib(retained / cards)}/card" if cards else ""
+        self._say(f"{name}: {cards} cards, retained {_kib(retained)}{per_card}, peak {_kib(peak)}")
+        for (filename, lineno), size in sites.most_common(MEMPROFILE_TOP):
+            if size <= 0:
+                break
+            self._say(f"    {_kib(size):>16}  {os.path.basename(filename)}:{lineno}  "
+                      f"{linecache.getline(filename, lineno).strip()[:60]}")
+
+    def check_leaks(self):
+        # между тестами не должно копиться: диалогов в overlay, живых полей
+        # прошлого теста вне пула, памяти при том же объёме
+        app = self.app
+        self._tests += 1
+        traced = tracemalloc.get_traced_memory()[0]
+        overlay = len(app.page.overlay)
+        if self._prev_overlay is not None and overlay > self._prev_overlay:
+            grown = Counter(type(c).__name__ for c in app.page.overlay[self._prev_overlay:])
+            self._say(f"leak? page.overlay {self._prev_overlay} -> {overlay}: "
+                      + ", ".join(f"{k} x{v}" for k, v in grown.items()))
+        keep = {id(tf) for tf in app.fields}
+        keep |= {id(slot[3]) for slot in app._pools["test"].idle()}
+        stale = [r() for r in self._prev_fields]
+        stale = [tf for tf in stale if tf is not None and id(tf) not in keep]
+        if stale:
+            self._say(f"leak? {len(stale)} TextField(s) of the previous test are still alive "
+                      f"outside the pool (e.g. referrers: "
+                      f"{sorted({type(r).__name__ for r in gc.get_referrers(stale[0])})})")
+        if self._prev_traced is not None:
+            self._say(f"test #{self._tests}: traced {traced / 2**20:.1f} MiB "
+                      f"({_kib(traced - self._prev_traced)} since previous test)")
+        self._prev_traced  = traced
+        self._prev_overlay = overlay
+        self._prev_fields  = [weakref.ref(tf) for tf in app.fields]
+
+
+# ─── Общие для всех сессий данные ────────────────────────────────────
+class SharedDeck:
+    # разобранный словарь, read-only; refs — сколько сессий его держат
+    __slots__ = ("fn", "mtime", "title", "sentence_mode", "compress_level", "cards", "refs")
+
+    def __init__(self, fn, mtime, data):
+        self.fn            = fn
+        self.mtime         = mtime
+        self.title         = data.get("title", deck_stem(fn))
+        self.sentence_mode = data.get("sentence_mode", False)
+        self.compress_level = data.get("compress_level")
+        self.cards         = tuple(MappingProxyType(c) if isinstance(c, dict) else c
+                                   for c in data.get("cards", []))
+        self.refs          = 0
+
+class SharedState:
+    # в web-режиме каждая вкладка получает свой FlashcardApp; переводы,
+    # заголовки словарей, разобранные словари и поисковый индекс read-only,
+    # поэтому держим их один раз на процесс
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self._i18n   = None
+        self._titles = {}   # fn -> (mtime, title, err_key)
+        self._decks  = {}   # (fn, mtime) -> SharedDeck
+        self._search = None
+        self._profiles = None
+
+    def profiles(self):
+        with self.lock:
+            if self._profiles is None:
+                self._profiles = ProfileStore()
+            return self._profiles
+
+    def translations(self):
+        with self.lock:
+            if self._i18n is None:
+                self._i18n = load_translations()
+            return self._i18n
+
+    def search_index(self):
+        with self.lock:
+            if self._search is None:
+                self._search = SearchIndex()
+                threading.Thread(target=self._search.sync, daemon=True).start()
+            return self._search
+
+    def deck_titles(self):
+        # [(fn, title, err_key)]; при смене mtime — вердикт из кеша проверки,
+        # разбор файла только для ещё не виденного содержимого
+        out = []
+        with os.scandir(WORDS_DIR) as it:
+            entries = sorted((e.name, e.stat().st_mtime) for e in it if is_deck_file(e.name))
+        for fn, mtime in entries:
+            cached = self._titles.get(fn)
+            if cached is None or cached[0] != mtime:
+                try:
+                    verdict, _ = validation_cache().check(os.path.join(WORDS_DIR, fn))
+                    title, err_key = verdict["title"] or fn, verdict["err_key"]
+                except OSError:
+                    title, err_key = fn, "import_error_json"
+                cached = self._titles[fn] = (mtime, title, err_key)
+            out.append((fn, cached[1], cached[2]))
+        return out
+
+    def acquire_deck(self, fn):
+        # бросает исключение, если файл не читается — вызывающий решает, что делать;
+        # битый словарь (DeckError) узнаём по хешу, не разбирая его заново
+        path = os.path.join(WORDS_DIR, fn)
+        key = (fn, os.path.getmtime(path))
+        with self.lock:
+            deck = self._decks.get(key)
+        if deck is None:
+            verdict, data = validation_cache().check(path)
+            if verdict["err_key"]:
+                raise DeckError(verdict["err_key"], verdict["err_args"])
+            parsed = SharedDeck(fn, key[1], data if data is not None else load_deck(path))
+            with self.lock:
+                deck = self._decks.setdefault(key, parsed)
+        with self.lock:
+            deck.refs += 1
+        return deck
+
+    def release_deck(self, deck):
+        with self.lock:
+            deck.refs -= 1
+            if deck.refs <= 0:
+                self._decks.pop((deck.fn, deck.mtime), None)
+
+SHARED = SharedState()
+
 class FlashcardApp:
     def __init__(self, page: Page):
         self.page = page
-        page.window_icon      = ICON_FILE
+        # диагностика памяти: обёртки ставим до build_tabs — кнопки берут их
+        if memprofile_enabled():
+            self._memprof = MemProfiler(self)
+            for name in MEMPROFILE_PAGES:
+                setattr(self, name, self._memprof.wrap(name, getattr(self, name)))
+        page.window_icon      = window_icon_file()
         page.title            = "KotoYon"
         page.window_maximized = True
 
-        # i18n
-        self.i18n = load_translations()
+        # i18n (общий на процесс)
+        self.i18n = SHARED.translations()
 
         # ensure words folder + template
         os.makedirs(WORDS_DIR, exist_ok=True)
@@ -80,12 +2131,25 @@ class FlashcardApp:
                 "correct_answers": 0,
                 "total_questions": 0,
                 "enable_hint": False,
-                "hint_threshold": 5
+                "hint_threshold": 5,
+                "import_fields": DEFAULT_IMPORT_FIELDS,
+                "romaji_system": "hepburn"
                 }, f, ensure_ascii=False, indent=2)
         with open(SETTINGS_FILE, encoding="utf-8") as f:
-            self.settings = json.load(f)
+            defaults = json.load(f)
+        # профиль пользователя поверх settings.json
+        self.profiles = SHARED.profiles()
+        self.user_id  = self._resolve_user()
+        if self.user_id == LOCAL_USER:
+            # десктоп: счётчики переезжают из settings.json один раз
+            self.profiles.seed_counters(self.user_id, {k: defaults.get(k, 0) for k in PROFILE_COUNTERS})
+        else:
+            defaults.update({k: 0 for k in PROFILE_COUNTERS})
+        self.settings = {**defaults, **self.profiles.load(self.user_id)}
+        self._saved_settings = dict(self.settings)
         # NEW SETTINGS ATTRIBUTES
         self.romaji_mode     = self.settings.get("romaji_mode", False)
+        self.normalize       = normalize_steps(self.settings.get("normalize", NORMALIZE_STEPS))
         self.fat_mode        = self.settings.get("fat_mode", False)
         self.tests_taken     = self.settings.get("tests_taken", 0)
         self.correct_answers = self.settings.get("correct_answers", 0)
@@ -95,6 +2159,17 @@ class FlashcardApp:
         self.enable_hint     = self.settings.get("enable_hint", False)
         self.hint_threshold  = self.settings.get("hint_threshold", 5)
 
+        # система ромадзи для автогенерации из каны
+        self.romaji_system   = self.settings.get("romaji_system", "hepburn")
+
+        # маппинг колонок для импорта CSV/TSV/Anki
+        self.import_fields   = self.settings.get("import_fields", DEFAULT_IMPORT_FIELDS)
+
+        # адаптивный режим: тест из adaptive_size карточек, слабые — чаще
+        self.adaptive_mode   = self.settings.get("adaptive_mode", False)
+        self.adaptive_size   = self.settings.get("adaptive_size", ADAPTIVE_SESSION)
+        self._samplers       = {}   # fn -> (mtime, WeightedSampler, word -> [индексы])
+
         self.selected_file   = self.settings.get("selected_file", "template.json")
         self.lang            = self.settings["language"]
         page.theme_mode      = ThemeMode.DARK if self.settings["theme"]=="dark" else ThemeMode.LIGHT
@@ -104,8 +2179,27 @@ class FlashcardApp:
 
         # state
         self.vocab   = []
+        self.session_started = None
+        self._session_logged = True
         self.results = []
         self.fields: list[TextField] = []
+        # diff для sentence_mode: idx -> Text, ещё не раскрашенный / готовые ops
+        self._diff_pending = {}
+        self._diff_cache   = {}
+        # варианты ответов по карточкам теста (answer_variants заранее)
+        self._variants     = []
+        # журнал текущего теста для «продолжить» после обрыва
+        self._journal      = None
+        # пулы карточек теста/результатов/слов и занятые сейчас карточки
+        self._pools = {"test":    ControlPool(self._new_test_card),
+                       "results": ControlPool(lambda: self._new_info_card(6)),
+                       "words":   ControlPool(lambda: self._new_info_card(8))}
+        self._slots = {part: [] for part in self._pools}
+        # фоновая подготовка выбранного словаря: "test"/"words" -> заготовка
+        self._prefetched     = {}
+        self._prefetch_lock  = threading.Lock()
+        self._prefetch_stop  = None
+        self._sampler_lock   = threading.Lock()
 
         # editor state
         self.word_rows     = None
@@ -113,9 +2207,23 @@ class FlashcardApp:
         self.is_editing    = False
         self.editing_file  = None
 
+        # поисковый индекс общий на процесс, догоняет изменения папки в фоне
+        self.search_index = SHARED.search_index()
+
+        # словари, которые держит эта сессия: слот -> SharedDeck
+        self._held = {}
+        self._flagged = set()   # битые словари, о которых уже сказали
+        # список слов листается по страницам прямо из mmap-файла
+        self.words_deck = None
+        page.on_close = lambda e: (self._cancel_prefetch(), self._close_journal(),
+                                   self._release_decks(), self._close_words_deck())
+
         # FilePicker
         self.fp = FilePicker(on_result=self.file_picked)
-        page.overlay.append(self.fp)
+        self.fp_export = FilePicker(on_result=self.export_picked)
+        self.fp_results = FilePicker(on_result=self.results_export_picked)
+        self._results_scope = "session"
+        page.overlay.extend([self.fp, self.fp_export, self.fp_results])
 
         # back button
         self.back_btn = ElevatedButton(self.t("back_home"), on_click=self.back_home)
@@ -131,6 +2239,9 @@ class FlashcardApp:
         self.refresh_labels()
         self.page.update()
 
+        # сохранённый словарь готовим заранее, пока пользователь осматривается
+        self._schedule_prefetch()
+
 
 
     def toggle_hint(self, e):
@@ -188,6 +2299,19 @@ class FlashcardApp:
 
 
 
+    def _resolve_user(self):
+        # десктоп — один пользователь; в вебе id живёт в client_storage браузера
+        if not getattr(self.page, "web", False):
+            return LOCAL_USER
+        try:
+            uid = self.page.client_storage.get("kotoyon.user_id")
+            if not uid:
+                uid = uuid.uuid4().hex
+                self.page.client_storage.set("kotoyon.user_id", uid)
+            return uid
+        except Exception:
+            return self.page.session_id
+
     def t(self, key):
         return self.i18n.get(self.lang, {}).get(key, f"<{key}>")
 
@@ -204,10 +2328,19 @@ class FlashcardApp:
             "correct_answers": self.correct_answers,
             "total_questions": self.total_questions,
             "enable_hint": self.enable_hint,
-            "hint_threshold": self.hint_threshold
+            "hint_threshold": self.hint_threshold,
+            "import_fields": self.import_fields,
+            "romaji_system": self.romaji_system,
+            "adaptive_mode": self.adaptive_mode,
+            "adaptive_size": self.adaptive_size,
+            "normalize": list(self.normalize)
         })
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.settings, f, ensure_ascii=False, indent=2)
+        # в профиль уходят только изменённые ключи; счётчики — через incr
+        changed = {k: v for k, v in self.settings.items()
+                   if k not in PROFILE_COUNTERS and self._saved_settings.get(k) != v}
+        if changed:
+            self.profiles.save(self.user_id, changed)
+            self._saved_settings.update(changed)
 
     def _compute_columns(self, count: int) -> int:
         for c in (4,3,2):
@@ -217,82 +2350,268 @@ class FlashcardApp:
     
 
 
-    # FILE PICKER IMPORT
-    def file_picked(self, e: FilePickerResultEvent):
-        if not e.files:
-            return
-        src = e.files[0].path
-        dst = os.path.join(WORDS_DIR, os.path.basename(src))
+    def _file_dd_options(self):
+        # список словарей для главного таба (заголовки кешируются на процесс)
+        return [dropdown.Option(fn, text=title if not err_key else "⚠ " + title)
+                for fn, title, err_key in SHARED.deck_titles()]
 
-        # Копируем временно в WORDS_DIR
+    def _hold(self, slot, fn):
+        # берём общий словарь в слот сессии, прежний отпускаем; None — не читается
         try:
-            shutil.copy(src, dst)
+            deck = SHARED.acquire_deck(fn)
         except Exception as ex:
-            sb = SnackBar(Text(self.t("copy_error").format(error=ex)))
-            self.page.snack_bar = sb; sb.open = True; self.page.update()
+            deck = None
+            self._flag_deck(fn, ex)
+        self._swap_held(slot, deck)
+        return deck
+
+    def _swap_held(self, slot, deck):
+        # уже взятый словарь (или None) в слот, прежний отпускаем
+        old = self._held.pop(slot, None)
+        if deck is not None:
+            self._held[slot] = deck
+        if old is not None:
+            SHARED.release_deck(old)
+
+    def _flag_deck(self, fn, ex):
+        # о битом словаре говорим один раз за сессию, дальше — только ⚠ в списке
+        if fn in self._flagged:
             return
+        self._flagged.add(fn)
+        error = self.t(ex.key).format(**ex.err_args) if isinstance(ex, DeckError) else str(ex)
+        sb = SnackBar(Text(self.t("deck_corrupt").format(fname=fn, error=error)))
+        self.page.snack_bar = sb; sb.open = True
 
-        # ВАЛИДАЦИЯ импортированного файла
-        valid = True
-        err_msg = ""
+    # PREFETCH
+    def _prefetch_key(self, part, fn):
+        # от чего зависит заготовка; не совпало при использовании — строим заново
         try:
-            with open(dst, encoding="utf-8") as f:
-                data = json.load(f)
-            # проверяем, что есть ключ "cards" и это список
-            cards = data.get("cards")
-            if not isinstance(cards, list):
-                valid = False
-                err_msg = self.t("import_error_no_cards")
-            else:
-                # каждый элемент должен быть dict с word и translation
-                for i, c in enumerate(cards):
-                    if not isinstance(c, dict) or \
-                    "word" not in c or not isinstance(c["word"], str) or \
-                    "translation" not in c or not isinstance(c["translation"], str):
-                        valid = False
-                        err_msg = self.t("import_error_bad_card").format(idx=i+1)
-                        break
-        except Exception as ex:
-            valid = False
-            err_msg = self.t("import_error_json").format(error=ex)
-
-        if not valid:
-            # удаляем скопированный некорректный файл
+            mtime = os.path.getmtime(os.path.join(WORDS_DIR, fn))
+        except OSError:
+            mtime = None
+        if part == "test":
+            return (fn, mtime, self.lang, self.direction_reversed, self.romaji_mode,
+                    self.show_romaji, self.romaji_system, self.adaptive_mode, self.adaptive_size,
+                    self.normalize)
+        if part == "resume":
+            # журнал дописан после заготовки — ответы в ней уже не те
             try:
-                os.remove(dst)
-            except:
-                pass
-            # показываем SnackBar с ошибкой
-            sb = SnackBar(Text(err_msg))
-            self.page.snack_bar = sb; sb.open = True; self.page.update()
+                st = os.stat(session_path(self.user_id))
+                journal = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                journal = None
+            return (fn, mtime, journal, self.lang, self.show_romaji, self.romaji_system,
+                    self.normalize)
+        return (fn, mtime, self.show_romaji, self.romaji_system)
+
+    def _schedule_prefetch(self):
+        # прежняя подготовка отменяется; сама работа — в отдельном потоке,
+        # чтобы не занимать общий таймер
+        # заготовка «продолжить» от выбранного словаря не зависит
+        self._cancel_prefetch(keep=("resume",))
+        stop = self._prefetch_stop = threading.Event()
+        fn = self.file_dd.value or "template.json"
+        SCHEDULER.call_later(
+            PREFETCH_DELAY,
+            lambda: threading.Thread(target=self._prefetch, args=(fn, stop), daemon=True).start(),
+            key=("prefetch", id(self)))
+
+    def _cancel_prefetch(self, keep=()):
+        SCHEDULER.cancel(("prefetch", id(self)))
+        if self._prefetch_stop is not None:
+            self._prefetch_stop.set()
+        with self._prefetch_lock:
+            stale = {p: pre for p, pre in self._prefetched.items() if p not in keep}
+            self._prefetched = {p: pre for p, pre in self._prefetched.items() if p in keep}
+        for part, pre in stale.items():
+            self._drop_prefetched(part, pre)
+
+    def _drop_prefetched(self, part, pre):
+        if part == "resume":
+            if pre["deck"] is not None:
+                SHARED.release_deck(pre["deck"])
+        elif part == "test":
+            SHARED.release_deck(pre["deck"])
+        # "words" — только данные первой страницы, держать нечего
+
+    def _store_prefetch(self, part, pre, stop):
+        with self._prefetch_lock:
+            if not stop.is_set():
+                pre, self._prefetched[part] = self._prefetched.get(part), pre
+        if pre is not None:
+            self._drop_prefetched(part, pre)
+
+    def _take_prefetch(self, part, fn):
+        with self._prefetch_lock:
+            pre = self._prefetched.pop(part, None)
+        if pre is None:
+            return None
+        if pre["key"] != self._prefetch_key(part, fn):
+            self._drop_prefetched(part, pre)
+            return None
+        return pre
+
+    def _prefetch(self, fn, stop):
+        try:
+            # 0) недоделанный тест — собираем его заранее, кнопка «продолжить» мгновенная
+            if self.resume_btn.visible and "resume" not in self._prefetched:
+                saved = load_session(self.user_id)
+                if saved is not None:
+                    pre = self._restore_session(*saved)
+                    if pre is not None:
+                        self._pools["test"].reserve(min(len(pre["cards"]), PREFETCH_FIRST_SCREEN))
+                        self._store_prefetch("resume", pre, stop)
+
+            # 1) разбор словаря (заодно попадает в общий кеш) и порядок карточек
+            key = self._prefetch_key("test", fn)
+            try:
+                deck = SHARED.acquire_deck(fn)
+            except Exception:
+                deck = None   # о битом словаре скажет сам start_test
+            if deck is not None:
+                if stop.is_set():
+                    SHARED.release_deck(deck)
+                    return
+                cards, sentence_mode, order = self._prepare_cards(deck)
+                # 2) варианты ответов и 3) карточки первого экрана в пуле
+                #    (привязка к данным и остальные — уже в start_test)
+                variants = [answer_variants(c, self.direction_reversed, self.romaji_mode,
+                                            self.normalize)
+                            for c in cards]
+                self._pools["test"].reserve(min(len(cards), PREFETCH_FIRST_SCREEN))
+                self._store_prefetch("test", {
+                    "key": key, "deck": deck, "cards": cards, "sentence_mode": sentence_mode,
+                    "order": order, "variants": variants
+                }, stop)
+
+            # 4) список слов: индекс mmap (ложится в кеш) и первая страница;
+            #    сам mmap сразу закрываем — на Windows отображённый файл
+            #    нельзя ни сохранить из редактора, ни удалить, ни заменить импортом
+            if stop.is_set():
+                return
+            key = self._prefetch_key("words", fn)
+            path = os.path.join(WORDS_DIR, fn)
+            verdict, _ = validation_cache().check(path)
+            if verdict["err_key"]:
+                return
+            words = MappedDeck(path)
+            try:
+                cards = fill_romaji(words.page(0), self.romaji_system)
+            finally:
+                words.close()
+            self._pools["words"].reserve(min(len(cards), PREFETCH_FIRST_SCREEN))
+            self._store_prefetch("words", {"key": key, "cards": cards}, stop)
+        except Exception:
+            traceback.print_exc()
+
+    def _release_decks(self):
+        for deck in self._held.values():
+            SHARED.release_deck(deck)
+        self._held.clear()
+
+    # FILE PICKER IMPORT
+    def file_picked(self, e: FilePickerResultEvent):
+        # файлы (можно несколько) или целая папка
+        if e.files:
+            sources, top = [f.path for f in e.files], None
+        elif e.path and os.path.isdir(e.path):
+            sources, top = [], e.path
+            for root, _, names in os.walk(e.path):
+                sources += [os.path.join(root, n) for n in sorted(names)
+                            if n.lower().endswith(IMPORT_EXTS)]
+        else:
             return
+        if not sources:
+            return
+        # имена в WORDS_DIR раздаём до запуска пула: два процесса не должны
+        # писать в один и тот же файл (и его .tmp)
+        targets = import_target_names(sources, top)
+
+        # ВАЛИДАЦИЯ / КОНВЕРТАЦИЯ: параллельно по ядрам, если файлов много;
+        # в WORDS_DIR попадают только валидные
+        worker = partial(import_deck_file, fields=self.import_fields)
+        if len(sources) >= IMPORT_POOL_MIN:
+            workers = min(len(sources), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                verdicts = list(pool.map(worker, sources, targets,
+                                         chunksize=max(1, len(sources) // (workers * 4))))
+        else:
+            verdicts = [worker(src, name) for src, name in zip(sources, targets)]
 
-        # Если всё ок — регистрируем файл в списках
-        opts = []
-        for fn in os.listdir(WORDS_DIR):
-            if fn.endswith(".json"):
-                try:
-                    d = json.load(open(os.path.join(WORDS_DIR, fn), encoding="utf-8"))
-                    title = d.get("title", fn)
-                except:
-                    title = fn
-                opts.append(dropdown.Option(fn, text=title))
-
-        new_name = os.path.basename(src)
-        self.file_dd.options   = opts
-        self.file_dd.value     = new_name
-        self.selected_file     = new_name
+        imported, errors = [], []
+        for name, err_key, err_args in verdicts:
+            if err_key is None:
+                imported.append(name)
+            else:
+                errors.append(f"{name}: {self.t(err_key).format(**err_args)}")
+
+        # каталог и поиск обновляем один раз в конце
+        if imported:
+            threading.Thread(target=lambda: [self.search_index.update_deck(n) for n in imported],
+                             daemon=True).start()
+            self.file_dd.options = self._file_dd_options()
+            self.file_dd.value   = imported[-1]
+            self.selected_file   = imported[-1]
+            self.save_settings()
+            self.dict_selector.options = self.get_dict_options()
+
+        if len(sources) == 1 and errors:
+            # одиночный файл — как раньше, просто SnackBar с ошибкой
+            sb = SnackBar(Text(errors[0].split(": ", 1)[1]))
+            self.page.snack_bar = sb; sb.open = True
+        elif errors:
+            # сводка по всем файлам с ошибками
+            dlg = CupertinoAlertDialog(
+                title=Text(self.t("import_summary").format(ok=len(imported), failed=len(errors))),
+                content=Column([Text(m, size=12) for m in errors], scroll="auto", height=300),
+                actions=[
+                    CupertinoDialogAction(self.t("ok"),
+                                          on_click=lambda ev: self._dismiss(ev))
+                ],
+                open=True
+            )
+            self.page.overlay.append(dlg)
+        elif len(imported) > 1:
+            sb = SnackBar(Text(self.t("import_summary").format(ok=len(imported), failed=0)))
+            self.page.snack_bar = sb; sb.open = True
+        self.page.update()
+
+    def search_changed(self, e):
+        q = e.control.value or ""
+        hits = self.search_index.search(q) if q.strip() else []
+        self.search_results.controls = [
+            ListTile(
+                title=Text(word),
+                subtitle=Text(f"{tr}{' · ' + rom if rom else ''} — {title}"),
+                dense=True,
+                on_click=lambda ev, fn=fn: self._select_deck(fn)
+            )
+            for fn, title, word, tr, rom in hits
+        ]
+        self.search_results.height = min(len(hits), 5) * 56
+        self.search_results.update()
+
+    def _select_deck(self, fn):
+        self.file_dd.value = fn
+        self.selected_file = fn
         self.save_settings()
         self.file_dd.update()
+        # заготовка прежнего словаря больше не нужна — готовим выбранный
+        self._schedule_prefetch()
 
     def file_changed(self, e):
         self.selected_file = e.control.value
         self.save_settings()
+        self._schedule_prefetch()
 
     def toggle_direction(self, e):
         self.direction_reversed = e.control.value; self.save_settings()
+    def toggle_adaptive(self, e):
+        self.adaptive_mode = e.control.value; self.save_settings()
     def toggle_romaji(self, e):
         self.show_romaji = e.control.value; self.save_settings()
+    def change_romaji_system(self, e):
+        self.romaji_system = e.control.value; self.save_settings()
     def toggle_theme(self, e):
         self.page.theme_mode = ThemeMode.DARK if e.control.value else ThemeMode.LIGHT
         self.page.update(); self.save_settings()
@@ -300,6 +2619,15 @@ class FlashcardApp:
         self.lang = e.control.value; self.save_settings(); self.refresh_labels(); self.page.update()
 
     def back_home(self, e):
+        self._close_words_deck()
+        self._free_slots()
+        # продолженный тест мог идти в других режимах — возвращаем сохранённые
+        self.direction_reversed = self.settings["direction_reversed"]
+        self.romaji_mode        = self.settings.get("romaji_mode", False)
+        self.dir_switch.value   = self.direction_reversed
+        self.resume_btn.visible = os.path.exists(session_path(self.user_id))
+        # к следующему тесту — новая заготовка (веса после теста уже учтены)
+        self._schedule_prefetch()
         self.test_page.visible    = False
         self.results_page.visible = False
         self.words_page.visible   = False
@@ -315,32 +2643,21 @@ class FlashcardApp:
         # 1) увеличиваем число попыток
         self.results[idx]["attempts"] += 1
 
-        # 2) проверяем ответ
-        key = "word" if self.direction_reversed else "translation"
-        variants = [
-            v.strip().lower()
-            for v in self.vocab[idx][key].split(",")
-            if v.strip()
-        ]
-        ent = tf.value.strip().lower()
-        # если режим перевод→слово и включён ромадзи‑мод, добавляем варианты ромадзи
-        if self.direction_reversed and self.romaji_mode:
-            roms = [
-                r.strip().lower()
-                for r in self.vocab[idx].get("romaji", "").split(",")
-                if r.strip()
-            ]
-            variants.extend(roms)
-
-        corr = ent in variants
+        # 2) проверяем ответ (та же логика, что и в CLI `grade`)
+        corr = grade_answer(self.vocab[idx], tf.value,
+                            self.direction_reversed, self.romaji_mode,
+                            self._variants[idx] if idx < len(self._variants) else None,
+                            self.normalize)
 
         self.results[idx]["entered"] = tf.value.strip()
         self.results[idx]["correct"] |= corr
+        if self._journal is not None:
+            r = self.results[idx]
+            self._journal.answer(idx, r["attempts"], r["correct"], r["entered"])
 
         # 3) если ответ верный — учитываем статистику
         if corr and self.results[idx]["attempts"] == 1:
-            self.correct_answers += 1
-            self.save_settings()
+            self.correct_answers = self.profiles.incr(self.user_id, "correct_answers")
 
         # 4) цвет поля
         if corr:
@@ -379,8 +2696,24 @@ class FlashcardApp:
     # ─────────── BUILD PAGES ─────────────────────────────────────────────────────
     def build_pages(self):
         self.test_page    = Column(visible=False, expand=True, scroll="auto")
-        self.results_page = Column(visible=False, expand=True, scroll="auto")
+        self.results_page = Column(visible=False, expand=True, scroll="auto",
+                                   on_scroll=self._on_results_scroll, on_scroll_interval=100)
         self.words_page   = Column(visible=False, expand=True, scroll="auto")
+        # постоянные лэйауты страниц (сетка, столбец для sentence_mode) и ряды
+        # сетки по 4 — между тестами меняются только их дети
+        self._layouts = {
+            "test":    (Row(wrap=True, spacing=20, alignment="start"),
+                        Column(spacing=20, expand=True)),
+            "results": (Column(spacing=20), Column(spacing=20, expand=True)),
+            "words":   (Column(spacing=20), Column(spacing=20, expand=True)),
+        }
+        self._grid_rows = {"results": [], "words": []}
+        self.results_btn = ElevatedButton(self.t("results_btn"), on_click=self.show_results)
+        self._test_footer = Container(
+            self.results_btn,
+            alignment=alignment.center,
+            padding=padding.only(top=20, bottom=20)
+        )
 
         # Editor tab
         self.dict_selector = Dropdown(
@@ -403,10 +2736,36 @@ class FlashcardApp:
             icon_color=Colors.RED
         )
 
+        # экспорт выбранного словаря в CSV/TSV
+        self.btn_export = IconButton(
+            icon=Icons.DOWNLOAD,
+            tooltip=self.t("export_dict"),
+            on_click=self.export_dict
+        )
+
         self.new_dict_name = TextField(label=self.t("new_dict_name"), width=300)
+        # фильтр строк редактора по мере ввода
+        self.filter_tf     = TextField(label=self.t("filter_rows"), prefix_icon=Icons.FILTER_LIST,
+                                       width=300, on_change=self.filter_rows)
+        self._filter_query = ""
+        self._filter_hits  = []
         self.word_rows     = Column(controls=[], spacing=4, expand=True, scroll="auto")
         self.word_inputs   = []
-        self.btn_add_word  = ElevatedButton(self.t("add_row"), icon=Icons.ADD, on_click=lambda e:self._add_word_row())
+        self.btn_add_word  = ElevatedButton(self.t("add_row"), icon=Icons.ADD,
+                                            on_click=lambda e: self._add_word_row(record=True))
+        # undo/redo: версии документа редактора (PersistentList) + что поменялось
+        self._doc  = PersistentList()
+        self._undo = deque(maxlen=UNDO_LIMIT)   # (вид, индекс, до, после)
+        self._redo = []
+        self.btn_undo = IconButton(icon=Icons.UNDO, tooltip=self.t("undo"),
+                                   disabled=True, on_click=self.undo)
+        self.btn_redo = IconButton(icon=Icons.REDO, tooltip=self.t("redo"),
+                                   disabled=True, on_click=self.redo)
+        self.btn_dedupe = ElevatedButton(
+            self.t("find_duplicates"),
+            icon=Icons.CALL_MERGE,
+            on_click=self.find_duplicates
+        )
         self.btn_save_dict = ElevatedButton(
             self.t("create_dict"),
             icon=Icons.SAVE,
@@ -414,6 +2773,12 @@ class FlashcardApp:
         )
 
 
+        # формат хранения словаря: JSON или сжатый с выбранным уровнем
+        self.compress_dd = Dropdown(
+            label=self.t("compression"), width=180, value="json",
+            options=[dropdown.Option(k, text=self._compress_text(k)) for k in COMPRESS_CHOICES]
+        )
+
         # создаём чекбокс Sentence Mode (с учётом i18n)
         self.sentence_mode_cb = Checkbox(
             label=self.t("sentence_mode"),
@@ -424,18 +2789,33 @@ class FlashcardApp:
 
         self.create_tab = Container(
             content=Column([
-                Row([self.dict_selector, self.btn_new, self.btn_delete], spacing=8),
+                Row([self.dict_selector, self.btn_new, self.btn_export, self.btn_delete,
+                     self.btn_undo, self.btn_redo], spacing=8),
                 self.new_dict_name,
-                Row([self.sentence_mode_cb], spacing=4),  
+                Row([self.sentence_mode_cb, self.compress_dd, self.filter_tf], spacing=16),
                 self.word_rows,
-                Row([self.btn_add_word, self.btn_save_dict], spacing=16)
+                Row([self.btn_add_word, self.btn_dedupe, self.btn_save_dict], spacing=16)
             ], expand=True, spacing=10),
             padding=padding.all(20)
         )
 
+    def _compress_text(self, key):
+        if key == "json":
+            return self.t("compression_none")
+        fmt, _, level = key.partition(":")
+        return f"{'gzip' if fmt == 'gz' else 'zstd'} · {level}"
+
+    def _compress_choice(self, fn, level):
+        # значение выпадашки по расширению файла и уровню из словаря
+        fmt = deck_format(fn)
+        key = fmt if fmt == "json" else f"{fmt}:{level or DEFAULT_COMPRESS_LEVEL[fmt]}"
+        if key not in [o.key for o in self.compress_dd.options]:
+            self.compress_dd.options.append(dropdown.Option(key, text=self._compress_text(key)))
+        return key
+
     def get_dict_options(self):
-        return [dropdown.Option(fn, text=os.path.splitext(fn)[0])
-                for fn in os.listdir(WORDS_DIR) if fn.endswith(".json")]
+        return [dropdown.Option(fn, text=deck_stem(fn))
+                for fn in os.listdir(WORDS_DIR) if is_deck_file(fn)]
 
     def _start_new_dict(self):
         # сброс режима редактирования
@@ -448,8 +2828,11 @@ class FlashcardApp:
 
         # очищаем поля
         self.new_dict_name.value = ""
+        self.compress_dd.value   = "json"
+        self._reset_filter()
         self.word_rows.controls.clear()
         self.word_inputs.clear()
+        self._reset_history()
 
         # текст кнопки — «Создать»
         self.btn_save_dict.text = self.t("create_dict")
@@ -457,7 +2840,11 @@ class FlashcardApp:
 
 
 
-    def _add_word_row(self, word="", tr="", rom=""):
+    def _add_word_row(self, word="", tr="", rom="", index=None, record=False, update=True):
+        # index — вставка в середину (redo/undo), record — шаг истории,
+        # update=False — при пакетной вставке страницу обновит вызывающий
+        # пустое ромадзи достраиваем из каны
+        rom = rom or kana_to_romaji(word, self.romaji_system) or ""
         # Создаём поля
         tf1 = TextField(label=self.t("word"),        expand=True, value=word)
         tf2 = TextField(label=self.t("translation"), expand=True, value=tr)
@@ -468,27 +2855,210 @@ class FlashcardApp:
             icon_color=Colors.RED
         )
 
-        # Вся строка
+        # Вся строка; row.data — ключ для фильтра (None = пересчитать)
         row = Row([tf1, tf2, tf3, del_btn], spacing=8)
+        def on_edit(e):
+            row.data = None
+            if e.control is tf1 and not (tf3.value or "").strip():
+                rom = kana_to_romaji(tf1.value or "", self.romaji_system)
+                if rom:
+                    tf3.value = rom
+                    tf3.update()
+            self._record_row(row)
+        tf1.on_blur = tf2.on_blur = tf3.on_blur = on_edit
+        # при активном фильтре новая строка тоже должна быть видна
+        if self._filter_query:
+            self._filter_hits.append(row)
 
         # Кортеж для удобного удаления
         trio = (tf1, tf2, tf3)
-        self.word_inputs.append(trio)
-        self.word_rows.controls.append(row)
+        if index is None:
+            index = len(self.word_inputs)
+        self.word_inputs.insert(index, trio)
+        self.word_rows.controls.insert(index, row)
+        if record:
+            self._push_edit("insert", index, self._doc.insert(index, self._row_values(trio)))
 
         # Колбэк: убираем и из контролов, и из списка данных
         def on_delete(e):
             if row in self.word_rows.controls:
-                self.word_rows.controls.remove(row)
-            if trio in self.word_inputs:
-                self.word_inputs.remove(trio)
+                i = self.word_rows.controls.index(row)
+                self._remove_word_row(i)
+                self._push_edit("delete", i, self._doc.delete(i))
             self.word_rows.update()
 
         del_btn.on_click = on_delete
 
         # Обновляем интерфейс редактора
+        if update:
+            self.word_rows.update()
+
+    def _remove_word_row(self, i):
+        del self.word_rows.controls[i]
+        del self.word_inputs[i]
+
+    # UNDO / REDO
+    @staticmethod
+    def _row_values(trio):
+        return tuple(tf.value or "" for tf in trio)
+
+    def _reset_history(self):
+        # новая точка отсчёта: загрузили словарь / начали новый
+        self._doc = PersistentList.from_iter(self._row_values(t) for t in self.word_inputs)
+        self._undo.clear()
+        self._redo.clear()
+        self._sync_undo_buttons()
+
+    def _push_edit(self, kind, index, after):
+        self._undo.append((kind, index, self._doc, after))
+        self._redo.clear()
+        self._doc = after
+        self._sync_undo_buttons()
+
+    def _record_row(self, row):
+        # правка полей фиксируется при уходе из поля, если значение поменялось
+        if row not in self.word_rows.controls:
+            return
+        i = self.word_rows.controls.index(row)
+        values = self._row_values(self.word_inputs[i])
+        if i < len(self._doc) and self._doc[i] != values:
+            self._push_edit("set", i, self._doc.set(i, values))
+
+    def _sync_undo_buttons(self):
+        self.btn_undo.disabled = not self._undo
+        self.btn_redo.disabled = not self._redo
+
+    def undo(self, e=None):
+        if not self._undo:
+            return
+        kind, i, before, after = entry = self._undo.pop()
+        self._redo.append(entry)
+        self._doc = before
+        self._apply_edit({"set": "set", "insert": "remove", "delete": "insert",
+                          "merge": "unmerge"}[kind], i, before)
+
+    def redo(self, e=None):
+        if not self._redo:
+            return
+        kind, i, before, after = entry = self._redo.pop()
+        self._undo.append(entry)
+        self._doc = after
+        self._apply_edit({"set": "set", "insert": "insert", "delete": "remove",
+                          "merge": "merge"}[kind], i, after)
+
+    def _set_word_row(self, i, values):
+        for tf, v in zip(self.word_inputs[i], values):
+            tf.value = v
+        self.word_rows.controls[i].data = None
+
+    def _apply_edit(self, action, i, doc):
+        # приводим строки редактора к версии doc; меняется только строка i,
+        # у слияния i = (оставленные, удалённые) — индексы до слияния
+        if action == "set":
+            self._set_word_row(i, doc[i])
+        elif action == "insert":
+            self._add_word_row(*doc[i], index=i, update=False)
+        elif action == "remove":
+            self._remove_word_row(i)
+        elif action == "merge":
+            kept, drop = i
+            self._reset_filter()
+            for j in reversed(drop):
+                self._remove_word_row(j)
+            for j in kept:
+                j -= bisect_left(drop, j)
+                self._set_word_row(j, doc[j])
+        else:
+            kept, drop = i
+            self._reset_filter()
+            for j in drop:
+                self._add_word_row(*doc[j], index=j, update=False)
+            for j in kept:
+                self._set_word_row(j, doc[j])
+        self._sync_undo_buttons()
+        self.page.update()
+
+
+    def find_duplicates(self, e):
+        cards = [{"word": tf1.value or "", "translation": tf2.value or "", "romaji": tf3.value or ""}
+                 for tf1, tf2, tf3 in self.word_inputs]
+        groups, exact, near = find_duplicate_cards(cards)
+        if not groups:
+            sb = SnackBar(Text(self.t("no_duplicates")))
+            self.page.snack_bar = sb; sb.open = True; self.page.update()
+            return
+
+        def on_dismiss(ev):
+            dlg.open = False
+            ev.control.page.update()
+        def on_merge(ev):
+            self._merge_duplicates(cards, groups)
+            on_dismiss(ev)
+
+        dlg = CupertinoAlertDialog(
+            title=Text(self.t("find_duplicates")),
+            content=Text(self.t("duplicates_found").format(exact=exact, near=near)),
+            actions=[
+                CupertinoDialogAction(self.t("yes"), on_click=on_merge),
+                CupertinoDialogAction(self.t("no"), on_click=on_dismiss),
+            ],
+            open=True
+        )
+        self.page.overlay.append(dlg)
+        self.page.update()
+
+    def _merge_duplicates(self, cards, groups):
+        # первая строка группы получает объединённые варианты, остальные удаляем
+        drop = set()
+        for g in groups:
+            merged = merge_card_group([cards[i] for i in g])
+            tf1, tf2, tf3 = self.word_inputs[g[0]]
+            tf2.value = merged["translation"]
+            tf3.value = merged.get("romaji", "")
+            self.word_rows.controls[g[0]].data = None
+            drop.update(g[1:])
+        pairs = [(trio, row) for i, (trio, row)
+                 in enumerate(zip(self.word_inputs, self.word_rows.controls)) if i not in drop]
+        self.word_inputs[:] = [trio for trio, _ in pairs]
+        self.word_rows.controls[:] = [row for _, row in pairs]
+        # в историю — только затронутые строки, а не весь словарь
+        drop  = sorted(drop)
+        kept  = [g[0] for g in groups]
+        after = self._doc
+        for i in reversed(drop):
+            after = after.delete(i)
+        for i in kept:
+            i -= bisect_left(drop, i)
+            after = after.set(i, self._row_values(self.word_inputs[i]))
+        self._push_edit("merge", (kept, drop), after)
+        self._reset_filter()
+        self.page.update()
+
+    def _row_key(self, row):
+        if row.data is None:
+            row.data = "\n".join(_search_norm(tf.value or "") for tf in row.controls[:3])
+        return row.data
+
+    def filter_rows(self, e):
+        q = _search_norm(e.control.value or "")
+        # если запрос только дописали — уточняем прошлый результат, иначе всё заново
+        refine = bool(self._filter_query) and q.startswith(self._filter_query)
+        pool = self._filter_hits if refine else self.word_rows.controls
+        hits = [r for r in pool if not q or q in self._row_key(r)]
+        hit_ids = set(map(id, hits))
+        for r in pool:
+            r.visible = id(r) in hit_ids
+        self._filter_query = q
+        self._filter_hits  = hits
         self.word_rows.update()
 
+    def _reset_filter(self):
+        # строки остаются в word_inputs, так что save_dict видит всё и при фильтре
+        self.filter_tf.value = ""
+        self._filter_query   = ""
+        self._filter_hits    = []
+        for r in self.word_rows.controls:
+            r.visible = True
 
     def load_selected_dict(self, e):
         fn = e.control.value
@@ -496,14 +3066,19 @@ class FlashcardApp:
             return
 
         path = os.path.join(WORDS_DIR, fn)
-        # 1) Попытка загрузить JSON
-        try:
-            with open(path, encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as ex:
+        # 1) Попытка загрузить JSON (через общий кеш словарей)
+        deck = self._hold("editor", fn)
+        if deck is not None:
+            data = {
+                "title": deck.title,
+                "cards": deck.cards,
+                "sentence_mode": deck.sentence_mode,
+                "compress_level": deck.compress_level
+            }
+        else:
             # в случае ошибки заводим пустую структуру
             data = {
-                "title": os.path.splitext(fn)[0],
+                "title": deck_stem(fn),
                 "cards": [],
                 "sentence_mode": False
             }
@@ -513,18 +3088,25 @@ class FlashcardApp:
         self.editing_file = path
 
         # 3) Заполняем поля редактора
-        self.new_dict_name.value = data.get("title", os.path.splitext(fn)[0])
+        self.new_dict_name.value = data.get("title", deck_stem(fn))
+        self.compress_dd.value   = self._compress_choice(fn, data.get("compress_level"))
         # синхронизируем чекбокс sentence_mode
         self.sentence_mode_cb.value = data.get("sentence_mode", False)
         self.sentence_mode_cb.update()
 
         # 4) Чистим старые строки и добавляем новые
+        self._reset_filter()
         self.word_rows.controls.clear()
         self.word_inputs.clear()
         for c in data.get("cards", []):
             self._add_word_row(c.get("word",""),
                             c.get("translation",""),
-                            c.get("romaji",""))
+                            c.get("romaji",""),
+                            update=False)
+        # индекс для фильтра строим сразу при загрузке
+        for row in self.word_rows.controls:
+            self._row_key(row)
+        self._reset_history()
 
         # 5) Обновляем текст кнопки и сам селектор
         self.btn_save_dict.text     = self.t("save_dict")
@@ -559,11 +3141,21 @@ class FlashcardApp:
             self.page.snack_bar = sb; sb.open = True; self.page.update()
             return
 
-        # 2) Определяем путь: редактируем или создаём новый
+        # 2) Определяем путь: редактируем или создаём новый;
+        #    расширение — по выбранному сжатию
+        fmt, _, level = (self.compress_dd.value or "json").partition(":")
+        level = int(level) if level else None
+        old_path = None
         if self.is_editing and self.editing_file:
-            path = self.editing_file
+            path = os.path.join(WORDS_DIR, deck_stem(self.editing_file) + DECK_FORMATS[fmt])
+            if path != self.editing_file:
+                old_path = self.editing_file
+                self.editing_file = path
+                if self.selected_file == os.path.basename(old_path):
+                    self.selected_file = os.path.basename(path)
+                    self.save_settings()
         else:
-            filename = f"{name.replace(' ', '_')}.json"
+            filename = f"{name.replace(' ', '_')}{DECK_FORMATS[fmt]}"
             path = os.path.join(WORDS_DIR, filename)
             self.is_editing   = True
             self.editing_file = path
@@ -577,28 +3169,29 @@ class FlashcardApp:
             "cards": cards,
             "sentence_mode": self.sentence_mode_cb.value
         }
+        if fmt != "json":
+            payload["compress_level"] = level
 
-        # 4) Записываем JSON на диск
+        # 4) Записываем JSON на диск (сжатый — потоком); при смене формата
+        #    старый файл убираем
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False, indent=2)
+            save_deck(path, payload, level)
+            if old_path:
+                os.remove(old_path)
         except Exception as ex:
             sb = SnackBar(Text(self.t("save_error").format(error=ex)))
             self.page.snack_bar = sb; sb.open = True; self.page.update()
             return
+        if old_path:
+            threading.Thread(target=self.search_index.remove_deck,
+                             args=(os.path.basename(old_path),), daemon=True).start()
+
+        threading.Thread(target=self.search_index.update_deck,
+                         args=(os.path.basename(path),), daemon=True).start()
 
         # 5) Обновляем выпадашки в main-tab и в editor-tab
         # — MAIN TAB
-        main_opts = []
-        for fn in os.listdir(WORDS_DIR):
-            if fn.endswith(".json"):
-                try:
-                    d = json.load(open(os.path.join(WORDS_DIR, fn), encoding="utf-8"))
-                    txt = d.get("title", fn)
-                except:
-                    txt = fn
-                main_opts.append(dropdown.Option(fn, text=txt))
-        self.file_dd.options = main_opts
+        self.file_dd.options = self._file_dd_options()
         self.file_dd.value   = self.selected_file
 
         # — EDITOR TAB
@@ -613,6 +3206,27 @@ class FlashcardApp:
         self.page.update()
 
 
+    def export_dict(self, e):
+        fn = self.dict_selector.value
+        if not fn:
+            return
+        self.fp_export.save_file(
+            file_name=deck_stem(fn) + ".csv",
+            allowed_extensions=["csv", "tsv"]
+        )
+
+    def export_picked(self, e: FilePickerResultEvent):
+        fn = self.dict_selector.value
+        if not e.path or not fn:
+            return
+        try:
+            export_deck_csv(os.path.join(WORDS_DIR, fn), e.path)
+            msg = self.t("saved_success").format(fname=os.path.basename(e.path))
+        except Exception as ex:
+            msg = self.t("save_error").format(error=ex)
+        sb = SnackBar(Text(msg))
+        self.page.snack_bar = sb; sb.open = True; self.page.update()
+
     def confirm_delete_dict(self, e):
         fn = self.dict_selector.value
         if not fn:
@@ -640,18 +3254,10 @@ class FlashcardApp:
         path = os.path.join(WORDS_DIR, fn)
         if os.path.exists(path):
             os.remove(path)
+        self.search_index.remove_deck(fn)
 
         # обновляем главный dropdown
-        main_opts = []
-        for f in os.listdir(WORDS_DIR):
-            if f.endswith(".json"):
-                try:
-                    d = json.load(open(os.path.join(WORDS_DIR, f), encoding="utf-8"))
-                    title = d.get("title", f)
-                except:
-                    title = f
-                main_opts.append(dropdown.Option(f, text=title))
-        self.file_dd.options = main_opts
+        self.file_dd.options = self._file_dd_options()
 
         # если только что удалённый был выбран, сбросим selection
         if self.selected_file == fn:
@@ -669,8 +3275,10 @@ class FlashcardApp:
         self.dict_selector.update()
 
         self.new_dict_name.value = ""
+        self._reset_filter()
         self.word_rows.controls.clear()
         self.word_inputs.clear()
+        self._reset_history()
         self.is_editing   = False
         self.editing_file = None
 
@@ -684,28 +3292,33 @@ class FlashcardApp:
         title = Text("KotoYon", size=64, weight="bold", color=Colors.BLUE)
         self.start_btn      = ElevatedButton(self.t("start_test"), icon=Icons.PLAY_ARROW, on_click=self.start_test)
         self.view_words_btn = ElevatedButton(self.t("show_words"), icon=Icons.LIST, on_click=self.show_words)
-        opts = []
-        for fn in os.listdir(WORDS_DIR):
-            if fn.endswith(".json"):
-                try:
-                    d = json.load(open(os.path.join(WORDS_DIR, fn), encoding="utf-8"))
-                    txt = d.get("title", fn)
-                except:
-                    txt = fn
-                opts.append(dropdown.Option(fn, text=txt))
-        self.file_dd      = Dropdown(options=opts, value=self.selected_file,
+        self.resume_btn     = ElevatedButton(self.t("resume_test"), icon=Icons.RESTORE, on_click=self.resume_test,
+                                             visible=os.path.exists(session_path(self.user_id)))
+        self.file_dd      = Dropdown(options=self._file_dd_options(), value=self.selected_file,
                                      on_change=self.file_changed, label=self.t("dictionary"))
         self.add_file_btn = ElevatedButton("+", tooltip=self.t("add_file"),
-                                           on_click=lambda e: self.fp.pick_files())
+                                           on_click=lambda e: self.fp.pick_files(
+                                               allow_multiple=True,
+                                               allowed_extensions=[x[1:] for x in IMPORT_EXTS]))
+        self.add_folder_btn = IconButton(icon=Icons.FOLDER_OPEN, tooltip=self.t("add_folder"),
+                                         on_click=lambda e: self.fp.get_directory_path())
         self.dir_switch   = Switch(label=self.t("reverse_test"), value=self.direction_reversed,
                                    on_change=self.toggle_direction)
+        self.adaptive_switch = Switch(label=self.t("adaptive_mode"), value=self.adaptive_mode,
+                                      on_change=self.toggle_adaptive)
+        # поиск по всем словарям
+        self.search_tf      = TextField(label=self.t("search"), prefix_icon=Icons.SEARCH,
+                                        width=420, on_change=self.search_changed)
+        self.search_results = Column([], spacing=0, scroll="auto", height=0, width=420)
 
         main_tab = Container(
             content=Column([
                 Row([logo, title], alignment="center", spacing=20),
-                Row([self.file_dd, self.add_file_btn], alignment="center", spacing=8),
-                Row([self.start_btn, self.view_words_btn], alignment="center", spacing=20),
-                Row([self.dir_switch], alignment="center"),
+                Row([self.file_dd, self.add_file_btn, self.add_folder_btn], alignment="center", spacing=8),
+                Row([self.start_btn, self.resume_btn, self.view_words_btn], alignment="center", spacing=20),
+                Row([self.dir_switch, self.adaptive_switch], alignment="center"),
+                Column([self.search_tf, self.search_results], spacing=4,
+                       horizontal_alignment="center"),
             ], alignment="center", horizontal_alignment="center", expand=True, spacing=30),
             padding=padding.all(20)
         )
@@ -734,6 +3347,13 @@ class FlashcardApp:
             value=self.romaji_mode,
             on_change=lambda e: setattr(self, "romaji_mode", e.control.value) or self.save_settings()
         )
+        # система транслитерации для автоматического ромадзи
+        self.romaji_system_dd = Dropdown(
+            label=self.t("romaji_system"), width=180,
+            options=[dropdown.Option("hepburn", text="Hepburn"),
+                     dropdown.Option("kunrei", text="Kunrei")],
+            value=self.romaji_system, on_change=self.change_romaji_system
+        )
         # настройка подсказки
         self.hint_switch     = Switch(
             label=self.t("enable_hint"),
@@ -767,6 +3387,7 @@ class FlashcardApp:
                 self.lang_dd,
                 self.romaji_cb,
                 self.romaji_mode_cb,
+                self.romaji_system_dd,
                 Row([self.hint_switch, self.hint_info_btn], spacing=4),
                 self.hint_threshold_tf,
                 self.donate_btn,
@@ -774,11 +3395,122 @@ class FlashcardApp:
             padding=padding.all(20)
         )
 
+        # статистика: строится при открытии вкладки из агрегатов
+        self.stats_deck_dd = Dropdown(label=self.t("dictionary"), width=300, value="",
+                                      on_change=lambda e: self._render_stats())
+        self.stats_body    = Column([], spacing=16, scroll="auto", expand=True)
+        stats_tab = Container(
+            content=Column([self.stats_deck_dd, self.stats_body], spacing=10, expand=True),
+            padding=padding.all(20)
+        )
+
         self.tabs = Tabs(tabs=[
             Tab(text=self.t("main_title"),   content=main_tab),
             Tab(text=self.t("settings"),     content=settings_tab),
             Tab(text=self.t("create_title"), content=self.create_tab),
-        ], expand=True)
+            Tab(text=self.t("stats"),        content=stats_tab),
+        ], expand=True, on_change=self._tab_changed)
+
+    # ADAPTIVE MODE
+    def _sampler(self, deck):
+        # строится один раз на словарь (веса — из профиля), дальше только обновляется
+        cached = self._samplers.get(deck.fn)
+        if cached is None or cached[0] != deck.mtime:
+            saved = self.profiles.weights(self.user_id, deck.fn)
+            index = {}
+            for i, c in enumerate(deck.cards):
+                index.setdefault(c["word"], []).append(i)
+            sampler = WeightedSampler(saved.get(c["word"], WEIGHT_NEW) for c in deck.cards)
+            cached = self._samplers[deck.fn] = (deck.mtime, sampler, index)
+        return cached[1], cached[2]
+
+    def _update_weights(self, deck):
+        # после теста — только карточки этого теста, и в профиле, и в выборке
+        outcomes = [(r["word"], r["attempts"], r["correct"]) for r in self.results if r["attempts"]]
+        new = self.profiles.update_weights(self.user_id, deck.fn, outcomes)
+        cached = self._samplers.get(deck.fn)
+        if cached and cached[0] == deck.mtime:
+            with self._sampler_lock:
+                for word, w in new.items():
+                    for i in cached[2].get(word, ()):
+                        cached[1].update(i, w)
+
+    # STATISTICS
+    def _tab_changed(self, e):
+        if self.tabs.selected_index == 3:
+            self._render_stats()
+
+    def _stats_backfill(self):
+        # агрегатов ещё нет, а история есть (она старше дашборда) — один проход
+        if self.profiles.has_stats(self.user_id):
+            return
+        for session, rows in itertools.groupby(iter_history(self.user_id),
+                                               key=lambda r: r.get("session")):
+            if session:
+                self.profiles.record_session(self.user_id, session[:10], list(rows))
+
+    def _bar_chart(self, values, peak, tip):
+        # столбики из Container: высота ∝ значению, значение — во всплывающей подсказке
+        return Row([
+            Container(width=12, height=max(2, 100 * v / peak) if v else 2,
+                      bgcolor=Colors.BLUE if v else Colors.GREY_300,
+                      border_radius=border_radius.all(2), tooltip=tip(day, v))
+            for day, v in values
+        ], spacing=3, vertical_alignment="end", height=110)
+
+    def _render_stats(self):
+        self._stats_backfill()
+        now = time.time()
+        days = [time.strftime("%Y-%m-%d", time.localtime(now - i * 86400))
+                for i in range(STATS_DAYS - 1, -1, -1)]
+        deck = self.stats_deck_dd.value or None
+        daily, missed, counters = self.profiles.stats(self.user_id, days[0], deck)
+
+        # 1) выпадашка словарей — те, что встречаются в окне
+        titles = {fn: title for fn, title, _ in SHARED.deck_titles()}
+        in_window = sorted({d for _, d, *_ in daily})
+        self.stats_deck_dd.options = [dropdown.Option("", text=self.t("stats_all_decks"))] + \
+            [dropdown.Option(fn, text=titles.get(fn, fn)) for fn in in_window]
+
+        # 2) сводим корзины по дням (с фильтром по словарю)
+        per_day = {}
+        for day, d, sessions, answers, correct, first_try in daily:
+            if deck and d != deck:
+                continue
+            b = per_day.setdefault(day, [0, 0, 0, 0])
+            b[0] += sessions; b[1] += answers; b[2] += correct; b[3] += first_try
+        answers = sum(b[1] for b in per_day.values())
+        first_try = sum(b[3] for b in per_day.values())
+
+        if not counters.get("tests_taken") and not per_day:
+            self.stats_body.controls = [Text(self.t("stats_empty"), size=16)]
+            self.page.update()
+            return
+
+        accuracy = [(day, round(100 * per_day[day][2] / per_day[day][1]) if per_day.get(day, [0, 0])[1] else 0)
+                    for day in days]
+        sessions = [(day, per_day[day][0] if day in per_day else 0) for day in days]
+        peak_sessions = max((v for _, v in sessions), default=0) or 1
+
+        summary = Row([
+            Text(f"{self.t('stats_tests')}: {counters.get('tests_taken', 0)}", size=16),
+            Text(f"{self.t('stats_questions')}: {counters.get('total_questions', 0)}", size=16),
+            Text(f"{self.t('stats_correct')}: {counters.get('correct_answers', 0)}", size=16),
+            Text(f"{self.t('stats_first_try')}: "
+                 f"{round(100 * first_try / answers) if answers else 0}%", size=16),
+        ], spacing=24, wrap=True)
+
+        self.stats_body.controls = [
+            summary,
+            Text(self.t("stats_accuracy"), size=18, weight="bold"),
+            self._bar_chart(accuracy, 100, lambda day, v: f"{day}: {v}%"),
+            Text(self.t("stats_sessions"), size=18, weight="bold"),
+            self._bar_chart(sessions, peak_sessions, lambda day, v: f"{day}: {v}"),
+            Text(self.t("stats_missed"), size=18, weight="bold"),
+            Column([Text(f"{word} — {n}× · {titles.get(d, d)}", size=14) for d, word, n in missed],
+                   spacing=4),
+        ]
+        self.page.update()
 
     # REFRESH LABELS
     def refresh_labels(self):
@@ -786,11 +3518,15 @@ class FlashcardApp:
         self.tabs.tabs[0].text      = self.t("main_title")
         self.start_btn.text         = self.t("start_test")
         self.view_words_btn.text    = self.t("show_words")
+        self.resume_btn.text        = self.t("resume_test")
         self.file_dd.label          = self.t("dictionary")
         self.add_file_btn.tooltip   = self.t("add_file")
+        self.add_folder_btn.tooltip = self.t("add_folder")
         self.file_dd.value          = self.selected_file
         self.dir_switch.label       = self.t("reverse_test")
         self.dir_switch.value       = self.direction_reversed
+        self.adaptive_switch.label  = self.t("adaptive_mode")
+        self.search_tf.label        = self.t("search")
 
         # ── SETTINGS ──
         self.tabs.tabs[1].text        = self.t("settings")
@@ -803,6 +3539,8 @@ class FlashcardApp:
         self.romaji_cb.value          = self.show_romaji
         self.romaji_mode_cb.label     = self.t("romaji_mode")
         self.romaji_mode_cb.value     = self.romaji_mode
+        self.romaji_system_dd.label   = self.t("romaji_system")
+        self.romaji_system_dd.value   = self.romaji_system
         self.hint_switch.label        = self.t("enable_hint")
         self.hint_switch.value        = self.enable_hint
         self.hint_info_btn.tooltip    = self.t("hint_info_tooltip")
@@ -811,12 +3549,22 @@ class FlashcardApp:
 
         # ── EDITOR ──
         self.tabs.tabs[2].text         = self.t("create_title")
+        self.tabs.tabs[3].text         = self.t("stats")
+        self.stats_deck_dd.label       = self.t("dictionary")
         self.dict_selector.label       = self.t("select_dictionary")
         self.new_dict_name.label       = self.t("new_dict_name")
         self.sentence_mode_cb.label    = self.t("sentence_mode")
+        self.filter_tf.label           = self.t("filter_rows")
+        self.compress_dd.label         = self.t("compression")
+        for o in self.compress_dd.options:
+            o.text = self._compress_text(o.key)
         self.btn_new.tooltip           = self.t("new_dict")
         self.btn_delete.tooltip        = self.t("delete_dict")
+        self.btn_export.tooltip        = self.t("export_dict")
+        self.btn_undo.tooltip          = self.t("undo")
+        self.btn_redo.tooltip          = self.t("redo")
         self.btn_add_word.text         = self.t("add_row")
+        self.btn_dedupe.text           = self.t("find_duplicates")
         self.btn_save_dict.text        = (self.t("save_dict")
                                           if self.is_editing
                                           else self.t("create_dict"))
@@ -834,6 +3582,7 @@ class FlashcardApp:
         self.back_btn.text = self.t("back_home")
 
         # ── TEST FIELDS ──
+        self.results_btn.text = self.t("results_btn")
         for tf in self.fields:
             tf.label = self.t("answer")
 
@@ -845,82 +3594,62 @@ class FlashcardApp:
 
     # TEST / RESULTS / WORDS (with auto‑submit on focus)
     def start_test(self, e):
-        # ЧИСТИМ старые страницы
-        self.test_page.controls.clear()
-        self.results_page.controls.clear()
-        self.words_page.controls.clear()
-
-        # Загружаем словарь
+        # страницы не чистим: карточки прошлого теста перепривяжутся к новому
+        # Загружаем словарь: если фон уже всё подготовил — берём заготовку,
+        # иначе то же самое здесь (карточки общие, перемешиваем свою копию)
         fn = self.file_dd.value or "template.json"
-        path = os.path.join(WORDS_DIR, fn)
-        try:
-            data = json.load(open(path, encoding="utf-8"))
-            cards = data.get("cards", [])
-            sentence_mode = data.get("sentence_mode", False)
-        except:
-            cards = DEFAULT_SET["cards"]
-            sentence_mode = False
-
-        random.shuffle(cards)
-        self.vocab = cards
+        pre = self._take_prefetch("test", fn)
+        if pre is not None:
+            self._swap_held("test", pre["deck"])
+            cards, sentence_mode, order = pre["cards"], pre["sentence_mode"], pre["order"]
+            self._variants = pre["variants"]
+        else:
+            deck = self._hold("test", fn)
+            cards, sentence_mode, order = self._prepare_cards(deck)
+            self._variants = [answer_variants(c, self.direction_reversed, self.romaji_mode,
+                                              self.normalize)
+                              for c in cards]
+        fields, elems = self._build_test_elems(cards, sentence_mode)
+        self.session_started = time.strftime("%Y-%m-%dT%H:%M:%S")
         self.results = [
             {"word": w["word"], "translation": w["translation"],
             "attempts": 0, "correct": False, "entered": ""}
             for w in cards
         ]
-        self.fields.clear()
 
-        # готовим UI‑карточки
-        elems = []
-        for i, w in enumerate(self.vocab):
-            prompt = w["translation"] if self.direction_reversed else w["word"]
-            tf = TextField(
-                label=self.t("answer"),
-                width=200 if not sentence_mode else None,
-                on_blur=lambda ev, idx=i: self._submit_on_blur(ev, idx)
-            )
-            self.fields.append(tf)
-
-            cont = Container(
-                content=Column([
-                    Text(prompt, size=20),
-                    Text(w.get("romaji", ""), size=14,
-                        visible=(self.show_romaji and not self.direction_reversed)),
-                    tf
-                ], spacing=5),
-                padding=padding.all(10),
-                border=border.all(1, Colors.GREY),
-                border_radius=border_radius.all(5),
-                width=None if sentence_mode else 220,
-                height=None if sentence_mode else 140,
-                expand=sentence_mode
-            )
-            elems.append(cont)
+        # журнал для «продолжить тест»: порядок — индексами в словаре;
+        # прежний недоделанный тест затирается вместе с его заготовкой
+        deck = self._held.get("test")
+        with self._prefetch_lock:
+            stale = self._prefetched.pop("resume", None)
+        if stale is not None:
+            self._drop_prefetched("resume", stale)
+        self._close_journal()
+        self._journal = SessionJournal(self.user_id, {
+            "deck": deck.fn if deck else None, "mtime": deck.mtime if deck else None,
+            "started": self.session_started, "order": order,
+            "direction_reversed": self.direction_reversed, "romaji_mode": self.romaji_mode
+        })
 
-        # Выбираем лэйаут: один столбец full-width или сетка
-        if sentence_mode:
-            test_layout = Column(elems, spacing=20, expand=True)
-        else:
-            test_layout = Row(elems, wrap=True, spacing=20, alignment="start")
+        # Статистика (при продолжении теста уже посчитана)
+        self.tests_taken     = self.profiles.incr(self.user_id, "tests_taken")
+        self.total_questions = self.profiles.incr(self.user_id, "total_questions", len(cards))
 
-        # Кнопка «Результаты»
-        results_btn = ElevatedButton(self.t("results_btn"), on_click=self.show_results)
+        self._open_test(cards, sentence_mode, fields, elems)
 
-        # Собираем страницу теста
+    def _open_test(self, cards, sentence_mode, fields, elems):
+        self.vocab = cards
+        self._session_logged = False
+        self._diff_cache.clear()
+        self.fields[:] = fields
+
+        # Лэйаут: один столбец full-width или сетка; страница — те же объекты
+        self.results_btn.text = self.t("results_btn")
         self.test_page.controls = [
-            test_layout,
-            Container(
-                results_btn,
-                alignment=alignment.center,
-                padding=padding.only(top=20, bottom=20)
-            )
+            self._layout("test", elems, sentence_mode),
+            self._test_footer
         ]
 
-        # Статистика
-        self.tests_taken += 1
-        self.total_questions += len(self.vocab)
-        self.save_settings()
-
         # Переключаем вкладки
         self.tabs.visible = False
         self.test_page.visible = True
@@ -928,9 +3657,208 @@ class FlashcardApp:
         self.words_page.visible = False
         self.page.update()
 
-        # Фокус на первое поле
-        if self.fields:
-            self.fields[0].focus()
+        # Фокус на первое неотвеченное поле
+        first = next((tf for tf in self.fields if not tf.disabled), None)
+        if first is not None:
+            first.focus()
+
+    def _prepare_cards(self, deck):
+        # -> (карточки теста в нужном порядке, sentence_mode, индексы в словаре)
+        if deck is not None:
+            source = deck.cards
+            sentence_mode = deck.sentence_mode
+        else:
+            source = DEFAULT_SET["cards"]
+            sentence_mode = False
+
+        if self.adaptive_mode and deck is not None:
+            sampler, _ = self._sampler(deck)
+            with self._sampler_lock:
+                order = sampler.sample(self.adaptive_size)
+        else:
+            order = list(range(len(source)))
+            random.shuffle(order)
+        cards = fill_romaji([source[i] for i in order], self.romaji_system)
+        return cards, sentence_mode, order
+
+    # RESUME
+    def _close_journal(self, done=False):
+        if self._journal is not None:
+            self._journal.close(done)
+            self._journal = None
+
+    def _restore_session(self, header, answers):
+        # журнал -> готовый тест с уже введёнными ответами; None — словарь
+        # удалили или поменяли, порядок по индексам уже не тот
+        fn = header.get("deck")
+        key = self._prefetch_key("resume", fn or "")
+        deck = None
+        if fn:
+            try:
+                deck = SHARED.acquire_deck(fn)
+            except Exception:
+                return None
+            if deck.mtime != header.get("mtime"):
+                SHARED.release_deck(deck)
+                return None
+        source = deck.cards if deck is not None else DEFAULT_SET["cards"]
+        sentence_mode = deck.sentence_mode if deck is not None else False
+        reversed_ = header["direction_reversed"]
+        cards = fill_romaji([source[i] for i in header["order"]], self.romaji_system)
+        variants = [answer_variants(c, reversed_, header["romaji_mode"], self.normalize)
+                    for c in cards]
+
+        # дельты поверх пустых результатов
+        results = [
+            {"word": w["word"], "translation": w["translation"],
+            "attempts": 0, "correct": False, "entered": ""}
+            for w in cards
+        ]
+        for idx, (attempts, correct, entered) in answers.items():
+            if 0 <= idx < len(cards):
+                r = results[idx]
+                r["attempts"], r["correct"], r["entered"] = attempts, correct, entered
+        return {"key": key, "deck": deck, "header": header, "cards": cards,
+                "sentence_mode": sentence_mode, "variants": variants, "results": results}
+
+    def resume_test(self, e):
+        saved = load_session(self.user_id)
+        pre = None
+        if saved is not None:
+            pre = self._take_prefetch("resume", saved[0].get("deck") or "")
+            if pre is None:
+                pre = self._restore_session(*saved)
+        if pre is None:
+            self.resume_btn.visible = False
+            sb = SnackBar(Text(self.t("resume_failed")))
+            self.page.snack_bar = sb; sb.open = True; self.page.update()
+            return
+        self._swap_held("test", pre["deck"])
+
+        # режимы — как были в тесте, настройки при этом не трогаем
+        header = pre["header"]
+        self.direction_reversed = header["direction_reversed"]
+        self.romaji_mode        = header["romaji_mode"]
+        self.dir_switch.value   = self.direction_reversed
+        self.session_started    = header["started"]
+        self._variants          = pre["variants"]
+        self.results            = pre["results"]
+        fields, elems = self._build_test_elems(pre["cards"], pre["sentence_mode"])
+        for tf, r in zip(fields, self.results):
+            if r["attempts"]:
+                tf.value    = r["entered"]
+                tf.bgcolor  = Colors.with_opacity(0.5, Colors.GREEN) if r["correct"] \
+                              else Colors.with_opacity(0.3, Colors.RED)
+                tf.disabled = r["correct"]
+
+        # журнал продолжаем дописывать
+        self._close_journal()
+        self._journal = SessionJournal(self.user_id)
+
+        self._open_test(pre["cards"], pre["sentence_mode"], fields, elems)
+
+    def _build_test_elems(self, cards, sentence_mode, reversed_=None):
+        # карточки теста из пула, привязанные к новым данным -> (поля ввода, контейнеры);
+        # reversed_ — направление продолжаемого теста, иначе текущее
+        if reversed_ is None:
+            reversed_ = self.direction_reversed
+        label = self.t("answer")
+        show_rom = self.show_romaji and not reversed_
+        fields, elems = [], []
+        for i, (w, slot) in enumerate(zip(cards, self._take_slots("test", len(cards)))):
+            cont, prompt, romaji, tf = slot
+            prompt.value   = w["translation"] if reversed_ else w["word"]
+            romaji.value   = w.get("romaji", "")
+            romaji.visible = show_rom
+            # поле — как новое
+            tf.data     = i
+            tf.value    = ""
+            tf.label    = label
+            tf.bgcolor  = None
+            tf.disabled = False
+            tf.width    = None if sentence_mode else 200
+            cont.width  = None if sentence_mode else 220
+            cont.height = None if sentence_mode else 140
+            cont.expand = sentence_mode
+            fields.append(tf)
+            elems.append(cont)
+        return fields, elems
+
+    # POOLS
+    def _new_test_card(self):
+        prompt = Text(size=20)
+        romaji = Text(size=14)
+        tf = TextField(on_blur=lambda ev: self._submit_on_blur(ev, ev.control.data))
+        cont = Container(
+            content=Column([prompt, romaji, tf], spacing=5),
+            padding=padding.all(10),
+            border=border.all(1, Colors.GREY),
+            border_radius=border_radius.all(5)
+        )
+        return cont, prompt, romaji, tf
+
+    def _new_info_card(self, spacing):
+        # карточка результата / слова: заголовок, ответ, ромадзи
+        head = Text(size=20, weight="bold", text_align="center")
+        body = Text(size=16, text_align="center")
+        rom  = Text(size=14, italic=True, text_align="center")
+        cont = Container(
+            content=Column(
+                [head, body, rom],
+                spacing=spacing,
+                alignment="center",
+                horizontal_alignment="center"
+            ),
+            padding=padding.all(12),
+            border=border.all(1, Colors.GREY),
+            border_radius=border_radius.all(5),
+            alignment=alignment.center
+        )
+        return cont, head, body, rom
+
+    def _take_slots(self, part, n):
+        # прежние карточки страницы — в пул, оттуда же (в том же порядке) новые
+        pool = self._pools[part]
+        pool.release(self._slots[part])
+        self._slots[part] = pool.acquire(n)
+        return self._slots[part]
+
+    def _free_slots(self):
+        # страницы скрыты: карточки пула остаются в лэйаутах, но свободны для
+        # фоновой подготовки следующего теста; не попавшие в пул из лэйаутов
+        # убираем, иначе они так и висят в памяти
+        self.fields.clear()
+        for part, pool in self._pools.items():
+            pool.release(self._slots[part])
+            self._slots[part] = []
+            kept = {id(slot[0]) for slot in pool.idle()}
+            grid, column = self._layouts[part]
+            column.controls = [c for c in column.controls if id(c) in kept]
+            if part == "test":
+                grid.controls = [c for c in grid.controls if id(c) in kept]
+                continue
+            for row in self._grid_rows[part]:
+                row.controls = [c for c in row.controls if id(c) in kept]
+            grid.controls = [row for row in grid.controls if row.controls]
+
+    def _layout(self, part, cards_ui, sentence_mode):
+        # постоянный лэйаут страницы с новыми детьми
+        grid, column = self._layouts[part]
+        if sentence_mode:
+            grid.controls, column.controls = [], cards_ui
+            return column
+        column.controls = []
+        if part == "test":
+            grid.controls = cards_ui
+            return grid
+        # жёстко 4 в ряд; ряды — те же объекты Row, что и в прошлый раз
+        rows = self._grid_rows[part]
+        need = -(-len(cards_ui) // 4)
+        rows += [Row(spacing=20, alignment="center") for _ in range(need - len(rows))]
+        for k, row in enumerate(rows):
+            row.controls = cards_ui[4 * k:4 * k + 4]
+        grid.controls = rows[:need]
+        return grid
 
     def toggle_sentence_mode(self, e):
         self.settings["sentence_mode"] = e.control.value
@@ -970,17 +3898,14 @@ class FlashcardApp:
             padding=padding.only(bottom=20)
         )
 
-        # 3) Загружаем флаг sentence_mode
-        fn = self.file_dd.value or "template.json"
-        path = os.path.join(WORDS_DIR, fn)
-        try:
-            data = json.load(open(path, encoding="utf-8"))
-            sentence_mode = data.get("sentence_mode", False)
-        except:
-            sentence_mode = False
+        # 3) Флаг sentence_mode — из словаря, на котором шёл тест
+        deck = self._held.get("test")
+        sentence_mode = deck.sentence_mode if deck else False
 
-        # 4) Собираем карточки
+        # 4) Карточки — из пула, с новыми данными
         cards_ui = []
+        self._diff_pending.clear()
+        slots = self._take_slots("results", len(self.results))
         for idx, r in enumerate(self.results):
             # вопрос и ключ
             if self.direction_reversed:
@@ -996,6 +3921,8 @@ class FlashcardApp:
             main = entered or (variants[0] if variants else "")
             others = [v for v in variants if v.lower() != main.lower()]
             answer_display = main + (f" ({', '.join(others)})" if others else "")
+            # в sentence_mode неверный ответ позже покажем как diff
+            needs_diff = sentence_mode and entered and not r["correct"] and variants
 
             # статус по той же логике, что и в copy
             mistakes = r["attempts"] - 1
@@ -1010,51 +3937,55 @@ class FlashcardApp:
             # ромадзи
             rom = ""
             if self.show_romaji and not self.direction_reversed:
-                rom = next((w.get("romaji","") for w in self.vocab if w["word"]==r["word"]), "").strip()
-
-            # собираем элементы карточки
-            txt_q = Text(f"{status} {question}", size=20, weight="bold", text_align="center")
-            txt_a = Text(answer_display, size=16, text_align="center")
-            col_items = [txt_q, txt_a]
-            if rom:
-                col_items.append(Text(rom, size=14, italic=True, text_align="center"))
-
-            cont = Container(
-                content=Column(
-                    col_items,
-                    spacing=6,
-                    alignment="center",
-                    horizontal_alignment="center"
-                ),
-                padding=padding.all(12),
-                border=border.all(1, Colors.GREY),
-                border_radius=border_radius.all(5),
-                width=None if sentence_mode else 220,
-                expand=sentence_mode,
-                alignment=alignment.center
-            )
+                rom = self.vocab[idx].get("romaji", "").strip()
+
+            # элементы карточки (diff‑спаны прошлого теста сбрасываем)
+            cont, txt_q, txt_a, txt_rom = slots[idx]
+            txt_q.value     = f"{status} {question}"
+            txt_a.value     = answer_display
+            txt_a.spans     = []
+            if needs_diff:
+                self._diff_pending[idx] = txt_a
+            txt_rom.value   = rom
+            txt_rom.visible = bool(rom)
+            cont.width  = None if sentence_mode else 220
+            cont.expand = sentence_mode
             cards_ui.append(cont)
 
-        # 5) Кнопка копирования
+        # 5) Кнопка копирования и экспорт в файл
         copy_btn = ElevatedButton(
             self.t("copy_results"),
             icon=Icons.FILE_COPY,
             on_click=self._copy_results_handler
         )
+        export_btn = ElevatedButton(
+            self.t("export_results"),
+            icon=Icons.SAVE_ALT,
+            on_click=lambda e: self._pick_results_file("session")
+        )
+        history_btn = ElevatedButton(
+            self.t("export_history"),
+            icon=Icons.HISTORY,
+            on_click=lambda e: self._pick_results_file("history")
+        )
 
-        # 6) Layout карточек
-        if sentence_mode:
-            results_layout = Column(cards_ui, spacing=20, expand=True)
-        else:
-            rows = [
-                Row(cards_ui[i:i+4], spacing=20, alignment="center")
-                for i in range(0, len(cards_ui), 4)
-            ]
-            results_layout = Column(rows, spacing=20)
+        # тест закончен — пишем его в историю (один раз)
+        if not self._session_logged:
+            self._session_logged = True
+            self._close_journal(done=True)
+            rows = list(self._result_rows())
+            append_history(self.user_id, rows)
+            self.profiles.record_session(self.user_id, self.session_started[:10], rows)
+            if self._held.get("test") is not None:
+                self._update_weights(self._held["test"])
+
+        # 6) Layout карточек: столбец или по 4 в ряд
+        results_layout = self._layout("results", cards_ui, sentence_mode)
 
         # 7) Футер
         footer = Container(
-            content=Row([copy_btn, self.back_btn], alignment="center", spacing=20),
+            content=Row([copy_btn, export_btn, history_btn, self.back_btn],
+                        alignment="center", spacing=20, wrap=True),
             padding=padding.only(top=20, bottom=20),
             alignment=alignment.center
         )
@@ -1070,18 +4001,92 @@ class FlashcardApp:
         self.test_page.visible    = False
         self.results_page.visible = True
         self.words_page.visible   = False
+        # дифы только для первых видимых карточек, остальные — при скролле
+        self._apply_visible_diffs(0, DIFF_BATCH, update=False)
         self.page.update()
 
+    def _answer_diff(self, idx):
+        # кешируем: одна карточка дифится не больше одного раза за тест
+        if idx not in self._diff_cache:
+            r = self.results[idx]
+            key = "word" if self.direction_reversed else "translation"
+            variants = [v.strip() for v in r[key].split(",") if v.strip()]
+            if self.direction_reversed and self.romaji_mode:
+                variants += [v.strip() for v in self.vocab[idx].get("romaji", "").split(",") if v.strip()]
+            entered = r["entered"].strip()
+            self._diff_cache[idx] = diff_answer(closest_variant(variants, entered), entered)
+        return self._diff_cache[idx]
+
+    def _apply_visible_diffs(self, first, last, update=True):
+        changed = False
+        for idx in range(max(0, first), min(len(self.results), last)):
+            txt = self._diff_pending.pop(idx, None)
+            if txt is None:
+                continue
+            spans = []
+            for op, chunk in self._answer_diff(idx):
+                if op == "+":
+                    style = TextStyle(color=Colors.RED, decoration=TextDecoration.LINE_THROUGH)
+                elif op == "-":
+                    style = TextStyle(color=Colors.GREEN, weight="bold",
+                                      decoration=TextDecoration.UNDERLINE)
+                else:
+                    style = None
+                spans.append(TextSpan(chunk, style=style))
+            txt.value = None
+            txt.spans = spans
+            changed = True
+        if changed and update:
+            self.page.update()
+
+    def _on_results_scroll(self, e):
+        if not self._diff_pending or not e.max_scroll_extent:
+            return
+        # sentence_mode — один столбец, так что индекс ≈ доля прокрутки
+        center = int(e.pixels / e.max_scroll_extent * len(self.results))
+        self._apply_visible_diffs(center - DIFF_BATCH, center + DIFF_BATCH)
+
+
+
+    def _result_rows(self):
+        key = "word" if self.direction_reversed else "translation"
+        deck = self._held.get("test")
+        for r in self.results:
+            yield {
+                "session":  self.session_started,
+                "deck":     deck.fn if deck else "template.json",
+                "word":     r["word"],
+                "expected": r[key],
+                "entered":  r["entered"],
+                "attempts": r["attempts"],
+                "status":   result_status(r),
+            }
 
+    def _pick_results_file(self, scope):
+        self._results_scope = scope
+        self.fp_results.save_file(
+            file_name=f"kotoyon_{scope}.csv",
+            allowed_extensions=["csv", "json"]
+        )
+
+    def results_export_picked(self, e: FilePickerResultEvent):
+        if not e.path:
+            return
+        rows = (iter_history(self.user_id) if self._results_scope == "history"
+                else self._result_rows())
+        try:
+            write_results(e.path, rows)
+            msg = self.t("saved_success").format(fname=os.path.basename(e.path))
+        except Exception as ex:
+            msg = self.t("save_error").format(error=ex)
+        sb = SnackBar(Text(msg))
+        self.page.snack_bar = sb; sb.open = True; self.page.update()
 
     def _copy_results_handler(self, ev):
         # 1) Заголовок
-        fn = self.file_dd.value or "template.json"
-        try:
-            d = json.load(open(os.path.join(WORDS_DIR, fn), encoding="utf-8"))
-        except:
-            d = DEFAULT_SET
-        title = d.get("title", os.path.splitext(fn)[0])
+        deck = self._held.get("test")
+        title = deck.title if deck else DEFAULT_SET["title"]
+        sentence_mode = deck.sentence_mode if deck else False
 
         # 2) Начинаем формировать строки
         lines = [title]
@@ -1110,6 +4115,10 @@ class FlashcardApp:
                 left = r["word"]
                 ans = r["entered"].strip() or r["translation"].split(",")[0].strip()
 
+            # в sentence_mode показываем, что именно не так в ответе
+            if sentence_mode and r["entered"].strip() and not r["correct"]:
+                ans = diff_markup(self._answer_diff(idx))
+
             items.append(f"{left}-{ans}-{status}")
 
         # 3) Разбиваем на колонки
@@ -1121,43 +4130,52 @@ class FlashcardApp:
         lines.append("by KotoYon")
         text = "\n".join(lines)
 
-        # 5) Копируем в буфер и анимируем кнопку
+        # 5) Копируем в буфер и анимируем кнопку; повторный клик только
+        #    переносит уже запланированный сброс цвета
         self.page.set_clipboard(text)
         btn = ev.control
-        orig = btn.bgcolor
+        key = ("reset_bgcolor", id(btn))
+        if not SCHEDULER.pending(key):
+            self._copy_btn_color = btn.bgcolor
         btn.bgcolor = Colors.GREEN
         btn.update()
         def reset():
-            time.sleep(0.5)
-            btn.bgcolor = orig
+            btn.bgcolor = self._copy_btn_color
             btn.update()
-        threading.Thread(target=reset, daemon=True).start()
+        SCHEDULER.call_later(0.5, reset, key=key)
 
 
 
 
     def show_words(self, e):
-        # 1) Заголовок
-        header = Container(
-            Text(self.t("word_list_title"), size=28, weight="bold"),
-            alignment=alignment.center,
-            padding=padding.only(top=20, bottom=10)
-        )
-
-        # 2) Загружаем словарь и режим sentence_mode
+        # Открываем словарь через mmap: в память попадает только текущая страница
         fn = self.file_dd.value or "template.json"
+        self._close_words_deck()
+        # из заготовки — готовая первая страница, mmap открываем здесь
+        # (индекс уже в кеше) и закрываем при выходе со страницы
+        pre = self._take_prefetch("words", fn)
         path = os.path.join(WORDS_DIR, fn)
         try:
-            data = json.load(open(path, encoding="utf-8"))
-            cards = data.get("cards", [])
-            sentence_mode = data.get("sentence_mode", False)
-        except:
-            cards = DEFAULT_SET["cards"]
-            sentence_mode = False
-
-        # 3) Собираем UI‑карточки
+            verdict, _ = validation_cache().check(path)
+            if verdict["err_key"]:
+                raise DeckError(verdict["err_key"], verdict["err_args"])
+            self.words_deck = MappedDeck(path)
+            self._words_cards    = self.words_deck
+            self._words_sentence = self.words_deck.sentence_mode
+        except Exception as ex:
+            self._flag_deck(fn, ex)
+            self._words_cards    = DEFAULT_SET["cards"]
+            self._words_sentence = False
+            pre = None
+        self.words_page_no = 0
+        self._render_words(pre["cards"] if pre is not None else None)
+
+    def _word_cards_ui(self, cards, sentence_mode):
+        # 3) Карточки страницы списка слов — из пула, с новыми данными
+        cards = fill_romaji(cards, self.romaji_system)
         cards_ui = []
-        for w in cards:
+        for w, slot in zip(cards, self._take_slots("words", len(cards))):
+            cont, txt_w, txt_t, txt_rom = slot
             # формат переводов
             vars_ = [v.strip() for v in w["translation"].split(",") if v.strip()]
             main = vars_[0] if vars_ else ""
@@ -1169,45 +4187,58 @@ class FlashcardApp:
             if self.show_romaji and w.get("romaji","").strip():
                 rom = w["romaji"].strip()
 
-            # создаём текстовые элементы
-            txt_w = Text(w["word"], size=20, weight="bold", text_align="center")
-            txt_t = Text(disp,     size=16,                           text_align="center")
-            col_items = [txt_w, txt_t]
-            if rom:
-                col_items.append(Text(rom, size=14, italic=True, text_align="center"))
-
-            # оборачиваем в Container
-            cont = Container(
-                content=Column(
-                    col_items,
-                    spacing=8,
-                    alignment="center",
-                    horizontal_alignment="center"
-                ),
-                padding=padding.all(12),
-                border=border.all(1, Colors.GREY),
-                border_radius=border_radius.all(5),
-                width=None if sentence_mode else 200,
-                expand=sentence_mode,
-                alignment=alignment.center
-            )
+            txt_w.value     = w["word"]
+            txt_t.value     = disp
+            txt_rom.value   = rom
+            txt_rom.visible = bool(rom)
+            cont.width  = None if sentence_mode else 200
+            cont.expand = sentence_mode
             cards_ui.append(cont)
+        return cards_ui
 
-        # 4) Лэйаут точно как в show_results
-        if sentence_mode:
-            # один столбец full‑width
-            word_layout = Column(cards_ui, spacing=20, expand=True)
-        else:
-            # жёстко 4 в ряд
-            rows = [
-                Row(cards_ui[i:i+4], spacing=20, alignment="center")
-                for i in range(0, len(cards_ui), 4)
-            ]
-            word_layout = Column(rows, spacing=20)
+    def _close_words_deck(self):
+        if self.words_deck is not None:
+            self.words_deck.close()
+            self.words_deck = None
+
+    def _words_goto(self, delta):
+        self.words_page_no += delta
+        self._render_words()
+
+    def _render_words(self, cards=None):
+        # 1) Заголовок
+        header = Container(
+            Text(self.t("word_list_title"), size=28, weight="bold"),
+            alignment=alignment.center,
+            padding=padding.only(top=20, bottom=10)
+        )
 
-        # 5) Кнопка «Назад»
+        # 2) Текущая страница словаря
+        total = len(self._words_cards)
+        pages = max(1, -(-total // WORDS_PAGE))
+        self.words_page_no = min(max(self.words_page_no, 0), pages - 1)
+        first = self.words_page_no * WORDS_PAGE
+        sentence_mode = self._words_sentence
+        if cards is None:
+            cards = [self._words_cards[i] for i in range(first, min(total, first + WORDS_PAGE))]
+        cards_ui = self._word_cards_ui(cards, sentence_mode)
+
+        # 4) Лэйаут точно как в show_results: столбец full‑width или 4 в ряд
+        word_layout = self._layout("words", cards_ui, sentence_mode)
+
+        # 5) Кнопка «Назад» (+ листалка, если страниц несколько)
+        footer = [self.back_btn]
+        if pages > 1:
+            footer = [
+                IconButton(icon=Icons.CHEVRON_LEFT, disabled=self.words_page_no == 0,
+                           on_click=lambda e: self._words_goto(-1)),
+                Text(f"{self.words_page_no + 1} / {pages}", size=16),
+                IconButton(icon=Icons.CHEVRON_RIGHT, disabled=self.words_page_no >= pages - 1,
+                           on_click=lambda e: self._words_goto(1)),
+                self.back_btn,
+            ]
         back_container = Container(
-            self.back_btn,
+            Row(footer, alignment="center", spacing=12),
             alignment=alignment.center,
             padding=padding.only(top=20, bottom=20)
         )
@@ -1231,9 +4262,111 @@ class FlashcardApp:
 
 
 
+# ─── Пакетная проверка: python mineWin.py grade answers.csv ──────────
+GRADE_CHUNK = 20000
+_grade_decks = {}   # кеш словарей в процессе-воркере: (dir, deck, system) -> {word: card}
+
+def _grade_deck(words_dir, deck, system):
+    key = (words_dir, deck, system)
+    if key not in _grade_decks:
+        try:
+            cards = load_deck(os.path.join(words_dir, deck)).get("cards", [])
+        except Exception:
+            cards = []
+        by_word = {}
+        # ромадзи достраиваем так же, как перед тестом в GUI
+        for c in fill_romaji(cards, system):
+            by_word.setdefault(c["word"].strip(), c)
+        _grade_decks[key] = by_word
+    return _grade_decks[key]
+
+def grade_rows(rows, words_dir=WORDS_DIR, direction_reversed=False,
+               romaji_mode=False, romaji_system="hepburn", normalize=NORMALIZE_STEPS):
+    # [(deck, word, response)] -> [(deck, word, response, correct|wrong|unknown)]
+    out = []
+    for deck, word, response in rows:
+        card = _grade_deck(words_dir, deck, romaji_system).get(word.strip())
+        if card is None:
+            verdict = "unknown"
+        elif grade_answer(card, response, direction_reversed, romaji_mode, steps=normalize):
+            verdict = "correct"
+        else:
+            verdict = "wrong"
+        out.append((deck, word, response, verdict))
+    return out
+
+def _iter_chunks(reader, size):
+    chunk = []
+    for row in reader:
+        if len(row) < 3:
+            continue
+        chunk.append((row[0], row[1], row[2]))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def cli(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(prog="mineWin.py grade",
+                                 description="Grade a CSV of (deck, word, response) rows "
+                                             "with the same rules as the test screen.")
+    ap.add_argument("input", help="CSV file, '-' for stdin")
+    ap.add_argument("-o", "--output", default="-", help="CSV file, '-' for stdout")
+    ap.add_argument("--words-dir", default=WORDS_DIR)
+    ap.add_argument("--reverse", action="store_true", help="translation → word direction")
+    ap.add_argument("--romaji-mode", action="store_true", help="accept romaji in reverse mode")
+    ap.add_argument("--romaji-system", choices=ROMAJI_SYSTEMS, default="hepburn")
+    ap.add_argument("--normalize", default=",".join(NORMALIZE_STEPS),
+                    help="comma-separated answer normalization steps "
+                         f"({', '.join(NORMALIZE_STEPS)}); '' to only trim and lowercase")
+    ap.add_argument("-j", "--jobs", type=int, default=1, help="worker processes")
+    args = ap.parse_args(argv)
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig", newline="")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    reader = csv.reader(src)
+    first = next(reader, None)
+    if first is not None and [c.strip().lower() for c in first[:3]] != ["deck", "word", "response"]:
+        reader = itertools.chain([first], reader)
+    writer = csv.writer(dst)
+    writer.writerow(["deck", "word", "response", "result"])
+
+    worker = partial(grade_rows, words_dir=args.words_dir, direction_reversed=args.reverse,
+                     romaji_mode=args.romaji_mode, romaji_system=args.romaji_system,
+                     normalize=normalize_steps(args.normalize.split(",")))
+    chunks = _iter_chunks(reader, GRADE_CHUNK)
+    totals = Counter()
+    def emit(graded):
+        writer.writerows(graded)
+        totals.update(r[3] for r in graded)
+
+    if args.jobs > 1:
+        # ограниченное окно задач: вход читается потоком, порядок строк сохраняется
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(worker, chunk))
+                if len(pending) >= args.jobs * 2:
+                    emit(pending.popleft().result())
+            while pending:
+                emit(pending.popleft().result())
+    else:
+        for chunk in chunks:
+            emit(worker(chunk))
+
+    if dst is not sys.stdout:
+        dst.close()
+    if src is not sys.stdin:
+        src.close()
+    print(f"correct: {totals['correct']}  wrong: {totals['wrong']}  "
+          f"unknown: {totals['unknown']}", file=sys.stderr)
+    return 0
+
+
 # ENTRY POINT
 def main(page: Page):
-    page.window_icon      = "icon.png"
     page.title            = "KotoYon"
     page.window_maximized = True
     page.update()
@@ -1241,5 +4374,26 @@ def main(page: Page):
     FlashcardApp(page)
 
 if __name__ == "__main__":
+    # нужно для пула процессов импорта в собранном exe
+    multiprocessing.freeze_support()
+    # python mineWin.py --memprofile — отчёты о памяти экранов в stderr
+    if "--memprofile" in sys.argv:
+        sys.argv.remove("--memprofile")
+        os.environ[MEMPROFILE_ENV] = "1"
+    if sys.argv[1:2] == ["grade"]:
+        sys.exit(cli(sys.argv[2:]))
+    # python mineWin.py selfcheck — правила проверки ответов на контрольных случаях
+    if sys.argv[1:2] == ["selfcheck"]:
+        failed = check_grading()
+        for card, entered, expected in failed:
+            print(f"FAIL {entered!r} vs {card}: expected {expected}", file=sys.stderr)
+        print(f"{len(GRADE_CHECKS) - len(failed)}/{len(GRADE_CHECKS)} ok")
+        sys.exit(1 if failed else 0)
+    # python mineWin.py assets — собрать иконки заранее (например, перед exe)
+    if sys.argv[1:2] == ["assets"]:
+        print(json.dumps(build_icon_assets(), indent=2))
+        sys.exit(0)
+    # favicon должен лежать в assets до старта веб-сервера
+    icon_manifest()
     flet.app(target=main, assets_dir="assets")
 